@@ -0,0 +1,124 @@
+"""
+The compressed artifacts: the files of the model folder that `--compress` writes as standard `.gz` or `.xz` files.
+
+`ChunkedCompressor` compresses the data written to it in independent chunks on a pool of threads, each one into
+a complete gzip member or xz stream, so the files can be decompressed on the board with `gzip -d`, `zcat` or
+`xz -d`, or as a stream with `decompress_artifact()`.
+
+Example:
+    >>> with ChunkedCompressor(open('yolov5_weight.dat.gz', 'wb'), 'gzip', threads=4) as writer:
+    ...     writer.write(weights)
+    >>> with open('yolov5_weight.dat.gz', 'rb') as reader:
+    ...     b''.join(decompress_artifact(reader, 'gzip')) == weights
+    True
+"""
+import io
+from typing import BinaryIO
+
+COMPRESSION_CHUNK_SIZE = 1024 * 1024    # The number of bytes to compress independently
+
+
+def compress_chunk(chunk: bytes, codec: str) -> bytes:
+    """
+    Compresses a chunk into a complete gzip member or xz stream. zlib and liblzma release the GIL while they work,
+    so it is run by the threads of `ChunkedCompressor` in parallel.
+
+    Args:
+        chunk (bytes): The data to compress.
+        codec (str): The codec, `gzip` or `xz`.
+
+    Returns:
+        bytes: The gzip member or xz stream, which carries the CRC of the chunk.
+    """
+    if codec == "xz":
+        import lzma
+        return lzma.compress(chunk, format=lzma.FORMAT_XZ)
+    import gzip
+    return gzip.compress(chunk, mtime=0)    # No timestamp, so the same input always gives the same output
+
+
+class ChunkedCompressor(io.RawIOBase):
+    """
+    Compresses the data written to it in independent chunks of `COMPRESSION_CHUNK_SIZE` on a pool of threads,
+    and writes them to another writer in order. At most two chunks per thread are in flight,
+    so the memory usage doesn't depend on the size of the data.
+
+    Each chunk is a complete gzip member or xz stream, and both formats allow them to be concatenated.
+    So the artifact is a plain `.gz` or `.xz` file that `gzip -d`, `zcat` or `xz -d` can decompress.
+
+    Parameters:
+        writer (BinaryIO): The writer of the compressed artifact. It is closed with the compressor.
+        codec (str): The codec, `gzip` or `xz`.
+        threads (int): The number of chunks to compress in parallel.
+    """
+
+    def __init__(self, writer: BinaryIO, codec: str, threads: int = 1):
+        from concurrent.futures import ThreadPoolExecutor
+        super().__init__()
+        self.writer = writer
+        self.codec = codec
+        self.executor = ThreadPoolExecutor(max_workers=max(1, threads))
+        self.max_pending = 2 * max(1, threads)
+        self.pending = list()       # The futures of the chunks that are not written yet, in order
+        self.buffer = bytearray()   # The data that is not a whole chunk yet
+        self.chunks = 0             # The number of chunks submitted so far
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self.buffer += data
+        while len(self.buffer) >= COMPRESSION_CHUNK_SIZE:
+            self.__submit(bytes(self.buffer[:COMPRESSION_CHUNK_SIZE]))
+            del self.buffer[:COMPRESSION_CHUNK_SIZE]
+        return len(data)
+
+    def __submit(self, chunk: bytes):
+        """
+        Queues a chunk to compress, and writes the chunks that are finished in order.
+
+        Args:
+            chunk (bytes): The data to compress.
+        """
+        self.chunks += 1
+        self.pending.append(self.executor.submit(compress_chunk, chunk, self.codec))
+        while len(self.pending) > 0 and (len(self.pending) > self.max_pending or self.pending[0].done()):
+            self.writer.write(self.pending.pop(0).result())
+
+    def close(self):
+        if not self.closed:
+            if len(self.buffer) > 0 or self.chunks == 0:
+                # An empty file still gets a member, as the tools reject a `.gz` or `.xz` file without any.
+                self.__submit(bytes(self.buffer))
+            for future in self.pending:
+                self.writer.write(future.result())
+            self.executor.shutdown()
+            self.writer.close()
+        super().close()
+
+
+def decompress_artifact(reader: BinaryIO, codec: str):
+    """
+    Decompresses a compressed artifact written by `ChunkedCompressor` as a stream, one block at a time.
+    The concatenated gzip members or xz streams are decoded one after the other, like `zcat` or `xz -d` do.
+
+    Args:
+        reader (BinaryIO): The readable stream of the compressed artifact.
+        codec (str): The codec that the artifact is compressed with, `gzip` or `xz`.
+
+    Yields:
+        bytes: The decompressed blocks of up to `COMPRESSION_CHUNK_SIZE` in order.
+
+    Raises:
+        OSError: If the stream is not a gzip file or is corrupt (`gzip.BadGzipFile`).
+        lzma.LZMAError: If the stream is not an xz file or is corrupt.
+        EOFError: If the stream is truncated.
+    """
+    if codec == "xz":
+        import lzma
+        stream = lzma.LZMAFile(reader)
+    else:
+        import gzip
+        stream = gzip.GzipFile(fileobj=reader)
+    with stream:
+        yield from iter(lambda: stream.read(COMPRESSION_CHUNK_SIZE), b"")
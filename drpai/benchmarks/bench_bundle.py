@@ -0,0 +1,106 @@
+"""
+Round-trip check and benchmark of the model bundle of `model_bundle.py`.
+
+The model folder converted from a synthetic deployment with a `drpai_model.h` of `--size` MB, plus an empty file,
+is packed, read back in place with `ModelBundle` and unpacked, and every file must come back byte-identical.
+A corrupt bundle and a member name that leaves the folder must be rejected.
+
+Example:
+    $ python3 benchmarks/bench_bundle.py --size 256
+"""
+import os
+import sys
+import shutil
+import argparse
+import tempfile
+import timeit
+from typing import Dict
+
+from loguru import logger
+
+from synthetic_deployment import generate_model_folder
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from model_bundle import BUNDLE_ALIGNMENT, pack_bundle, ModelBundle  # noqa: E402
+
+
+def read_model_folder(directory: str) -> Dict[str, bytes]:
+    """
+    Reads the files of a model folder, without the hidden files of the converter like its cache.
+
+    Returns:
+        dict[str, bytes]: The contents of each file, by its name.
+    """
+    files = dict()
+    for name in sorted(os.listdir(directory)):
+        if not name.startswith("."):
+            with open(f"{directory}/{name}", "rb") as f:
+                files[name] = f.read()
+    return files
+
+
+def check_rejected(function, message: str):
+    """
+    Checks that a function fails with an `AssertionError`.
+    """
+    try:
+        function()
+    except AssertionError:
+        return
+    raise AssertionError(message)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Round-trip check and benchmark of the model bundle')
+    parser.add_argument('--size', type=float, default=64,
+                        help='The size of drpai_model.h of the synthetic deployment in MB. (default: 64)')
+    parser.add_argument('--repeat', type=int, default=3, help='The number of times to repeat each measurement.')
+    args = parser.parse_args()
+    logger.disable("model_bundle")     # Without the line of each unpacked file
+
+    workdir = tempfile.mkdtemp(prefix="ei2gst_bundle_")
+    try:
+        model_path = generate_model_folder(workdir, args.size)
+        open(f"{model_path}/model_empty.txt", "wb").close()     # An empty member
+        files = read_model_folder(model_path)
+        names = sorted(files)
+        bundle_path = f"{workdir}/model.bundle"
+        pack_time = min(timeit.repeat(lambda: pack_bundle(model_path, names, bundle_path),
+                                      number=1, repeat=args.repeat))
+
+        with ModelBundle(bundle_path) as bundle:
+            assert sorted(bundle.members) == names, "The bundle doesn't list the packed files."
+            for name, data in files.items():
+                with bundle.get(name) as view:
+                    assert view == data, f"{name} differs in the bundle."
+                assert bundle.members[name][0] % BUNDLE_ALIGNMENT == 0, f"{name} is not aligned in the bundle."
+            verify_time = min(timeit.repeat(lambda: [bundle.verify(name) for name in names],
+                                            number=1, repeat=args.repeat))
+            unpack_time = min(timeit.repeat(lambda: bundle.unpack(f"{workdir}/unpacked"),
+                                            number=1, repeat=args.repeat))
+        for name, data in files.items():
+            with open(f"{workdir}/unpacked/{name}", "rb") as f:
+                assert f.read() == data, f"{name} differs after unpacking."
+
+        # A flipped byte of a member must fail the checksums, and nothing is written.
+        shutil.copy(bundle_path, f"{workdir}/corrupt.bundle")
+        with ModelBundle(bundle_path) as bundle:
+            offset = bundle.members["model_weight.dat"][0]
+        with open(f"{workdir}/corrupt.bundle", "r+b") as f:
+            f.seek(offset)
+            flipped = bytes([f.read(1)[0] ^ 0xff])
+            f.seek(offset)
+            f.write(flipped)
+        with ModelBundle(f"{workdir}/corrupt.bundle") as bundle:
+            check_rejected(lambda: bundle.unpack(f"{workdir}/corrupt"), "A corrupt bundle is unpacked.")
+        assert not os.path.exists(f"{workdir}/corrupt"), "A corrupt bundle writes files."
+        check_rejected(lambda: pack_bundle(workdir, ["model/../model.bundle"], f"{workdir}/evil.bundle"),
+                       "A member name with a directory is packed.")
+    finally:
+        shutil.rmtree(workdir)
+
+    total = sum(len(data) for data in files.values()) / 1e6
+    print(f"Packing, verifying and unpacking {len(files)} files of {total:.1f} MB round-trips.")
+    for name, seconds in (("pack_bundle", pack_time), ("ModelBundle.verify", verify_time),
+                          ("ModelBundle.unpack", unpack_time)):
+        print(f"  {name:<20} {seconds:8.3f} s  {total / seconds:8.1f} MB/s")
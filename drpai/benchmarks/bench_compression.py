@@ -0,0 +1,101 @@
+"""
+Round-trip check and benchmark of the compressed artifacts of `artifact_compression.py`.
+
+The weight file converted from a synthetic deployment with a `drpai_model.h` of `--size` MB, whose blocks are
+half random and half zeros like sparse weights, is compressed by `ChunkedCompressor` with each codec and number
+of `--threads`, which must not change the output. It must decompress back byte-identical with
+`decompress_artifact()`, with the standard `gzip` and `lzma` modules, and with the `gzip` and `xz` tools when
+they are installed.
+
+Example:
+    $ python3 benchmarks/bench_compression.py --size 256 --threads 1 2 4
+"""
+import io
+import os
+import sys
+import gzip
+import lzma
+import shutil
+import argparse
+import tempfile
+import subprocess
+import timeit
+
+from synthetic_deployment import generate_model_folder
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from ei2gst_drpai import COMPRESSION_CODECS  # noqa: E402
+from artifact_compression import COMPRESSION_CHUNK_SIZE, ChunkedCompressor, decompress_artifact  # noqa: E402
+
+STANDARD_DECOMPRESSORS = {"gzip": gzip.decompress, "xz": lzma.decompress}
+STANDARD_TOOLS = {"gzip": ["gzip", "-dc"], "xz": ["xz", "-dc"]}
+
+
+def read_weights(size: float) -> bytes:
+    """
+    Converts a synthetic deployment with half of the weights zeroed and reads its weight file.
+    """
+    workdir = tempfile.mkdtemp(prefix="ei2gst_compression_")
+    try:
+        model_path = generate_model_folder(workdir, size, zeros=0.5)
+        with open(f"{model_path}/model_weight.dat", "rb") as f:
+            return f.read()
+    finally:
+        shutil.rmtree(workdir)
+
+
+class MemoryWriter(io.BytesIO):
+    """
+    Keeps the written data after it is closed, as `ChunkedCompressor` closes its writer.
+    """
+
+    def close(self):
+        if not self.closed:
+            self.data = self.getvalue()
+        super().close()
+
+
+def compress(data: bytes, codec: str, threads: int) -> bytes:
+    """
+    Compresses data with `ChunkedCompressor`, writing it in blocks like the hex decoder does.
+    """
+    writer = MemoryWriter()
+    with ChunkedCompressor(writer, codec, threads) as compressor:
+        for start in range(0, len(data), 300000):
+            compressor.write(data[start:start + 300000])
+    return writer.data
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Round-trip check and benchmark of the compressed artifacts')
+    parser.add_argument('--size', type=float, default=64,
+                        help='The size of drpai_model.h of the synthetic deployment in MB. (default: 64)')
+    parser.add_argument('--threads', type=int, nargs='+', default=sorted({1, os.cpu_count() or 1}),
+                        help='The numbers of threads to compress with.')
+    parser.add_argument('--repeat', type=int, default=3, help='The number of times to repeat each measurement.')
+    args = parser.parse_args()
+
+    data = read_weights(args.size)
+    for codec in COMPRESSION_CODECS:
+        for sample in (b"", b"x", data[:COMPRESSION_CHUNK_SIZE], data):
+            compressed = compress(sample, codec, 2)
+            assert b"".join(decompress_artifact(io.BytesIO(compressed), codec)) == sample, \
+                f"{codec} doesn't round-trip {len(sample)} bytes through decompress_artifact()."
+            assert STANDARD_DECOMPRESSORS[codec](compressed) == sample, \
+                f"{codec} of {len(sample)} bytes is not readable by the standard {codec} module."
+            if shutil.which(STANDARD_TOOLS[codec][0]) is not None:
+                assert subprocess.run(STANDARD_TOOLS[codec], input=compressed, stdout=subprocess.PIPE,
+                                      check=True).stdout == sample, \
+                    f"{codec} of {len(sample)} bytes is not readable by the {STANDARD_TOOLS[codec][0]} tool."
+
+    print(f"Compressing {len(data) / 1e6:.1f} MB round-trips with {', '.join(COMPRESSION_CODECS)}:")
+    print(f"  {'Codec':<6} {'Threads':>7}  {'Ratio':>6}  {'Compress':>13}  {'Decompress':>13}")
+    for codec in COMPRESSION_CODECS:
+        compressed = compress(data, codec, 1)
+        decompress_time = min(timeit.repeat(lambda: b"".join(decompress_artifact(io.BytesIO(compressed), codec)),
+                                            number=1, repeat=args.repeat))
+        for threads in args.threads:
+            assert compress(data, codec, threads) == compressed, f"{codec} depends on the number of threads."
+            compress_time = min(timeit.repeat(lambda: compress(data, codec, threads), number=1, repeat=args.repeat))
+            print(f"  {codec:<6} {threads:>7}  {len(compressed) / len(data):>6.1%}  "
+                  f"{len(data) / 1e6 / compress_time:>8.1f} MB/s  {len(data) / 1e6 / decompress_time:>8.1f} MB/s")
@@ -0,0 +1,151 @@
+"""
+Benchmark of the converter on synthetic deployments of growing sizes.
+
+For each size, a deployment is generated by `synthetic_deployment.py` and converted in a fresh process with
+`--report`, and the throughput of `gen_drpai_model_files`, `read_variables` and `gen_anchors_txt` with the
+peak memory of the process are recorded.
+
+The regression check is opt-in, as the throughput depends on the machine: store a baseline on the reference
+machine with `--save-baseline`, and the later runs on it fail when the converter is slower, or when a size or a
+stage has no baseline entry. Without a baseline file, the results are only printed.
+
+Example:
+    $ python3 benchmarks/bench_converter.py --sizes 1 64 --save-baseline   # On the reference machine
+    $ python3 benchmarks/bench_converter.py --sizes 1 64                   # Fails if slower than the baseline
+"""
+import os
+import sys
+import json
+import shutil
+import argparse
+import tempfile
+import subprocess
+from typing import List, Tuple
+
+from synthetic_deployment import generate_deployment
+
+SCRIPT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "ei2gst_drpai.py")
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+STAGES = ("gen_drpai_model_files", "read_variables", "gen_anchors_txt")
+MIN_MEASURABLE_TIME = 0.05      # Stages faster than this (in seconds) are too noisy to compare their throughput
+MEMORY_SLACK = 8 * 1024         # The peak memory can grow this much (in KB) on top of the tolerance
+
+
+def run_conversion(deployment: str) -> dict:
+    """
+    Converts a deployment in a fresh process, ignoring the cache.
+
+    Args:
+        deployment (str): The path of the deployment directory.
+
+    Returns:
+        dict: The `peak_rss` of the process in KB and the `wall_time` in seconds and `throughput` in MB/s of
+            each of the `STAGES`.
+    """
+    report_path = os.path.join(deployment, "report.json")
+    process = subprocess.Popen([sys.executable, SCRIPT_PATH, "benchmark", "--force", "--jobs", "1",
+                                "--report", report_path], cwd=deployment,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    _, status, usage = os.wait4(process.pid, 0)
+    process.returncode = os.waitstatus_to_exitcode(status)
+    assert process.returncode == 0, f"The conversion of {deployment} has failed."
+
+    with open(report_path, "rt") as f:
+        report = json.load(f)
+    result = {"peak_rss": usage.ru_maxrss, "stages": dict()}
+    for measurements in report["stages"]:
+        if measurements["stage"] in STAGES:
+            result["stages"][measurements["stage"]] = {
+                "wall_time": measurements["wall_time"],
+                "throughput": measurements["read_throughput"],
+            }
+    return result
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> Tuple[List[str], List[str]]:
+    """
+    Compares the benchmark results with the baseline.
+
+    Args:
+        results (dict): The results of each size.
+        baseline (dict): The baseline results of each size.
+        tolerance (float): The acceptable ratio of regression, e.g. 0.25 for 25%.
+
+    Returns:
+        (list[str], list[str]): The description of each regression or missing baseline entry, and of each
+            stage that is too fast to compare at its size.
+    """
+    regressions = list()
+    warnings = list()
+    for size, result in results.items():
+        if size not in baseline:
+            regressions.append(f"{size}: There is no baseline entry. Use --save-baseline to store one.")
+            continue
+        reference = baseline[size]
+        if result["peak_rss"] > reference["peak_rss"] * (1 + tolerance) + MEMORY_SLACK:
+            regressions.append(f"{size}: The peak memory has grown from {reference['peak_rss'] / 1024:.1f} MB "
+                               f"to {result['peak_rss'] / 1024:.1f} MB.")
+        for stage, measurements in result["stages"].items():
+            if stage not in reference["stages"]:
+                regressions.append(f"{size}: There is no baseline entry of {stage}. Use --save-baseline to store one.")
+                continue
+            if measurements["wall_time"] < MIN_MEASURABLE_TIME:
+                warnings.append(f"{size}: {stage} takes less than {MIN_MEASURABLE_TIME * 1000:g} ms, which is too "
+                                f"noisy to compare. Benchmark a bigger size to check it.")
+                continue
+            reference_throughput = reference["stages"][stage]["throughput"]
+            if measurements["throughput"] < reference_throughput * (1 - tolerance):
+                regressions.append(f"{size}: The throughput of {stage} has dropped from "
+                                   f"{reference_throughput:.1f} MB/s to {measurements['throughput']:.1f} MB/s.")
+    return regressions, warnings
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark of the converter on synthetic deployments')
+    parser.add_argument('--sizes', type=float, nargs='+', default=[1, 16, 64],
+                        help='The sizes of drpai_model.h to benchmark in MB.')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='The number of conversions of each size. The best of them is recorded.')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='The JSON file of the baseline results.')
+    parser.add_argument('--save-baseline', action='store_true', help='Store the results as the new baseline.')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='The acceptable ratio of regression compared to the baseline. (default: 0.25)')
+    parser.add_argument('--workdir', help='The directory to generate the deployments in. (default: a temporary one)')
+    args = parser.parse_args()
+
+    workdir = args.workdir if args.workdir is not None else tempfile.mkdtemp(prefix="ei2gst_benchmark_")
+    results = dict()
+    print(f"{'Size':>8}  {'Stage':<24}  {'Wall time':>10}  {'Throughput':>12}  {'Peak memory':>12}")
+    for size in args.sizes:
+        deployment = os.path.join(workdir, f"{size:g}MB")
+        generate_deployment(deployment, size)
+        runs = [run_conversion(deployment) for _ in range(args.repeat)]
+        best = {"peak_rss": min(r["peak_rss"] for r in runs),
+                "stages": {stage: max((r["stages"][stage] for r in runs if stage in r["stages"]),
+                                      key=lambda m: m["throughput"])
+                           for stage in STAGES if stage in runs[0]["stages"]}}
+        results[f"{size:g}MB"] = best
+        for stage, measurements in best["stages"].items():
+            print(f"{size:>6g}MB  {stage:<24}  {measurements['wall_time']:>8.3f} s  "
+                  f"{measurements['throughput']:>7.1f} MB/s  {best['peak_rss'] / 1024:>9.1f} MB")
+    if args.workdir is None:
+        shutil.rmtree(workdir)
+
+    if args.save_baseline:
+        baseline = dict()
+        if os.path.exists(args.baseline):
+            with open(args.baseline, "rt") as f:
+                baseline = json.load(f)
+        baseline.update(results)
+        with open(args.baseline, "wt") as f:
+            json.dump(baseline, f, indent=2)
+        print(f"The baseline is saved in {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline, "rt") as f:
+            failures, warnings = compare(results, json.load(f), args.tolerance)
+        for message in warnings + failures:
+            print(message, file=sys.stderr)
+        sys.exit(1 if len(failures) > 0 else 0)
+    else:
+        print(f"There is no baseline in {args.baseline}, so the results are not compared. "
+              f"Use --save-baseline on the reference machine to store one.")
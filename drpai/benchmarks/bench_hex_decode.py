@@ -0,0 +1,78 @@
+"""
+Micro-benchmark of the hex-literal decoder `csv_2_bytearray()` against the previous per-token implementation.
+
+Example:
+    $ python3 benchmarks/bench_hex_decode.py --size 8
+"""
+import os
+import sys
+import random
+import argparse
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from ei2gst_drpai import csv_2_bytearray  # noqa: E402
+
+
+def csv_2_bytearray_legacy(s: str) -> bytearray:
+    """
+    The previous implementation of `csv_2_bytearray()` that converts one hex value at a time.
+    """
+    c = 0
+    array = []
+    while c < len(s):
+        i = s.find(",", c)
+        substr = s[c:i] if i != -1 else s[c:]
+        value = int(substr.strip(), 16)
+        array.append(value)
+        c += len(substr)+1
+    r = bytearray(array)
+    return r
+
+
+def gen_array_body(size: int, per_line: int = 12) -> str:
+    """
+    Generates a C array body of `size` random bytes, formatted like `xxd -i` with `per_line` values per line.
+    """
+    data = random.Random(0).randbytes(size)
+    lines = [", ".join(f"0x{b:02x}" for b in data[i:i+per_line]) for i in range(0, size, per_line)]
+    return "  " + ",\n  ".join(lines) + "\n"
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark of the hex-literal decoder')
+    parser.add_argument('--size', type=float, default=4, help='The size of the decoded array in MB.')
+    parser.add_argument('--repeat', type=int, default=3, help='The number of times to repeat each measurement.')
+    args = parser.parse_args()
+
+    body = gen_array_body(int(args.size * 1024 * 1024))
+    lines = body.splitlines()
+    expected = bytearray().join(csv_2_bytearray_legacy(line) for line in lines)
+    assert csv_2_bytearray(body) == expected, "Bulk decoding is not byte-identical to the legacy decoder."
+    assert bytearray().join(csv_2_bytearray(line) for line in lines) == expected, \
+        "Line by line decoding is not byte-identical to the legacy decoder."
+    # Values that are not written with two digits, or are split by whitespace, must give the same result or
+    # error as the legacy decoder
+    for line in ("0x5, 0x12, 0xa", "0x1, 0x123", "0x123, 0x1,", "0x12 0x34, 0x56", "0x1 2", "0x12, 0x3 4,",
+                 "0x 12,", "0 x12,", " 0x12 ,0x34\n"):
+        try:
+            expected_value = csv_2_bytearray_legacy(line)
+        except ValueError:
+            expected_value = ValueError
+        try:
+            value = csv_2_bytearray(line)
+        except ValueError:
+            value = ValueError
+        assert value == expected_value, f"Decoding {line!r} differs from the legacy decoder."
+
+    cases = {
+        "legacy, per line": lambda: [csv_2_bytearray_legacy(line) for line in lines],
+        "bulk, per line": lambda: [csv_2_bytearray(line) for line in lines],
+        "bulk, whole body (str)": lambda: csv_2_bytearray(body),
+        "bulk, whole body (bytes)": lambda: csv_2_bytearray(body_bytes),
+    }
+    body_bytes = body.encode("ascii")
+    print(f"Decoding {len(expected) / 1e6:.1f} MB from {len(body) / 1e6:.1f} MB of hex text:")
+    for name, case in cases.items():
+        seconds = min(timeit.repeat(case, number=1, repeat=args.repeat))
+        print(f"  {name:<26} {seconds:8.3f} s  {len(expected) / 1e6 / seconds:8.1f} MB/s")
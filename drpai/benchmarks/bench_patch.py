@@ -0,0 +1,105 @@
+"""
+Round-trip check and benchmark of the delta patch of `delta_patch.py`.
+
+The old model folder is converted from a synthetic deployment with a `drpai_model.h` of `--size` MB. Its copy is
+changed like a retrained model: bytes are inserted, removed and overwritten in the weights, a file is renamed,
+one is changed, one is removed and one is added. The patch from the old folder to the new one is applied to
+another copy of the old folder, which must then match the new folder exactly. Applying it to a folder it wasn't
+made for must fail and leave that folder as it was.
+
+Example:
+    $ python3 benchmarks/bench_patch.py --size 256
+"""
+import os
+import sys
+import random
+import shutil
+import argparse
+import tempfile
+import time
+from typing import Dict
+
+from loguru import logger
+
+from synthetic_deployment import generate_model_folder
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from delta_patch import create_patch, apply_patch  # noqa: E402
+
+
+def read_folder(directory: str) -> Dict[str, bytes]:
+    """
+    Reads the files of a model folder, without the hidden files of the converter like its cache.
+    """
+    files = dict()
+    for name in sorted(os.listdir(directory)):
+        if not name.startswith("."):
+            with open(f"{directory}/{name}", "rb") as f:
+                files[name] = f.read()
+    return files
+
+
+def edit_model_folder(directory: str):
+    """
+    Changes the files of a model folder like a retrained model, a few edits away from the original.
+    """
+    rng = random.Random(0)
+    with open(f"{directory}/model_weight.dat", "rb") as f:
+        weights = bytearray(f.read())
+    for _ in range(8):
+        position = rng.randrange(len(weights))
+        edit = rng.choice(("insert", "remove", "overwrite"))
+        if edit == "insert":
+            weights[position:position] = rng.randbytes(100)
+        elif edit == "remove":
+            del weights[position:position + 100]
+        else:
+            weights[position:position + 100] = rng.randbytes(len(weights[position:position + 100]))
+    with open(f"{directory}/model_weight.dat", "wb") as f:
+        f.write(weights)
+    os.rename(f"{directory}/drp_param.bin", f"{directory}/drp_param_v2.bin")
+    with open(f"{directory}/model_labels.txt", "ab") as f:
+        f.write(b"cherry\n")
+    os.remove(f"{directory}/model_anchors.txt")
+    with open(f"{directory}/model_notes.txt", "wb") as f:
+        f.write(b"Retrained with more cherries.\n")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Round-trip check and benchmark of the delta patch')
+    parser.add_argument('--size', type=float, default=64,
+                        help='The size of drpai_model.h of the synthetic deployment in MB. (default: 64)')
+    args = parser.parse_args()
+    logger.disable("delta_patch")     # Without the line of each patched file
+
+    workdir = tempfile.mkdtemp(prefix="ei2gst_patch_")
+    try:
+        old_path = generate_model_folder(f"{workdir}/deployment", args.size)
+        shutil.copytree(old_path, f"{workdir}/new")
+        edit_model_folder(f"{workdir}/new")
+        shutil.copytree(old_path, f"{workdir}/board")
+        new = read_folder(f"{workdir}/new")
+
+        start_time = time.perf_counter()
+        stats = create_patch(old_path, f"{workdir}/new", f"{workdir}/model.patch")
+        create_time = time.perf_counter() - start_time
+        start_time = time.perf_counter()
+        apply_patch(f"{workdir}/model.patch", f"{workdir}/board")
+        apply_time = time.perf_counter() - start_time
+        assert read_folder(f"{workdir}/board") == new, "The patched folder doesn't match the new folder."
+
+        # The board now has the new folder, which the patch wasn't made for.
+        try:
+            apply_patch(f"{workdir}/model.patch", f"{workdir}/board")
+        except AssertionError:
+            pass
+        else:
+            raise AssertionError("A patch is applied to a folder it wasn't made for.")
+        assert read_folder(f"{workdir}/board") == new, "A rejected patch changes the folder."
+    finally:
+        shutil.rmtree(workdir)
+
+    print(f"Patching {stats['new_size'] / 1e6:.1f} MB of files round-trips with a patch of "
+          f"{stats['patch_size'] / 1e3:.1f} KB, reusing {stats['reused'] / max(stats['new_size'], 1):.1%} of them.")
+    for name, seconds in (("create_patch", create_time), ("apply_patch", apply_time)):
+        print(f"  {name:<14} {seconds:8.3f} s  {stats['new_size'] / 1e6 / seconds:8.1f} MB/s")
@@ -0,0 +1,128 @@
+"""
+Throughput benchmark of the reference YOLOv5 post-processing in `yolov5_reference.py`.
+
+Random raw outputs are decoded for the grids, anchors and labels of a model folder, in batches of `--frames`.
+By default the model folder is converted from a deployment generated by `synthetic_deployment.py`. With `--check`,
+the detections of the first batch are compared with a plain per-frame, per-box implementation.
+
+Example:
+    $ python3 benchmarks/bench_postprocess.py --frames 1 16 64 --check
+    $ python3 benchmarks/bench_postprocess.py --model ../yolov5 --frames 32
+"""
+import os
+import sys
+import shutil
+import argparse
+import tempfile
+import timeit
+from typing import List
+
+import numpy as np
+
+from synthetic_deployment import generate_model_folder
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from yolov5_reference import YoloV5PostProcessor, NUM_ANCHORS, sigmoid  # noqa: E402
+
+
+def gen_raw_outputs(post_processor: YoloV5PostProcessor, frames: int, seed: int = 0) -> np.ndarray:
+    """
+    Generates random raw outputs where a few cells of each frame have a high objectness.
+
+    Args:
+        post_processor (YoloV5PostProcessor): The post-processor that defines the grids and classes.
+        frames (int): The number of frames.
+        seed (int): The seed of the random values.
+
+    Returns:
+        np.ndarray: The `(frames, values)` float32 outputs.
+    """
+    rng = np.random.default_rng(seed)
+    raw = rng.normal(0, 2, (frames, sum(post_processor.output_sizes))).astype(np.float32)
+    for output in post_processor.split_outputs(raw):
+        objectness = output.reshape(frames, NUM_ANCHORS, -1, output.shape[2] * output.shape[3])[:, :, 4]
+        objectness[...] = rng.normal(-7, 2.5, objectness.shape)
+    return raw
+
+
+def post_process_plain(post_processor: YoloV5PostProcessor, raw: np.ndarray) -> List[np.ndarray]:
+    """
+    Decodes each box of each frame one at a time and suppresses them with a greedy loop, as a plain
+    implementation of the same post-processing to check `YoloV5PostProcessor` against.
+    """
+    results = list()
+    for frame_outputs in raw:
+        candidates = list()
+        for output, (width, height), anchors in zip(post_processor.split_outputs(frame_outputs), post_processor.grids,
+                                                     post_processor.anchors):
+            output = sigmoid(output[0].astype(np.float64)).reshape(NUM_ANCHORS, -1, height, width)
+            for a in range(NUM_ANCHORS):
+                for y in range(height):
+                    for x in range(width):
+                        values = output[a, :, y, x]
+                        c = int(np.argmax(values[5:]))
+                        score = values[4] * values[5 + c]
+                        if score <= post_processor.confidence_threshold:
+                            continue
+                        cx = (values[0] * 2 - 0.5 + x) * post_processor.input_width / width
+                        cy = (values[1] * 2 - 0.5 + y) * post_processor.input_height / height
+                        w = (values[2] * 2) ** 2 * anchors[a][0]
+                        h = (values[3] * 2) ** 2 * anchors[a][1]
+                        candidates.append((cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2, score, c))
+
+        candidates.sort(key=lambda box: -box[4])
+        kept = list()
+        for box in candidates[:post_processor.max_candidates]:
+            if all(box[5] != k[5] or iou(box, k) <= post_processor.iou_threshold for k in kept):
+                kept.append(box)
+        results.append(np.array(kept[:post_processor.max_detections]).reshape(-1, 6))
+    return results
+
+
+def iou(a: tuple, b: tuple) -> float:
+    """
+    Calculates the intersection over union of two `x1, y1, x2, y2` boxes.
+    """
+    intersection = max(0, min(a[2], b[2]) - max(a[0], b[0])) * max(0, min(a[3], b[3]) - max(a[1], b[1]))
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - intersection
+    return intersection / union
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark of the reference YOLOv5 post-processing')
+    parser.add_argument('--model', help='The path of a model folder. (default: a converted synthetic deployment)')
+    parser.add_argument('--input-size', type=int, default=640,
+                        help='The input size of the synthetic deployment. (default: 640)')
+    parser.add_argument('--frames', type=int, nargs='+', default=[1, 8, 32],
+                        help='The numbers of frames to post-process in each call.')
+    parser.add_argument('--repeat', type=int, default=5, help='The number of calls. The best of them is reported.')
+    parser.add_argument('--confidence', type=float, default=0.5, help='The confidence threshold. (default: 0.5)')
+    parser.add_argument('--check', action='store_true', help='Compare the first batch with a plain implementation.')
+    args = parser.parse_args()
+
+    workdir = None
+    model_path = args.model
+    if model_path is None:
+        workdir = tempfile.mkdtemp(prefix="ei2gst_benchmark_")
+        model_path = generate_model_folder(workdir, 0.1, "benchmark", input_size=args.input_size)
+    post_processor = YoloV5PostProcessor(model_path, confidence_threshold=args.confidence)
+    if workdir is not None:
+        shutil.rmtree(workdir)
+
+    print(f"Grids: {post_processor.grids}, classes: {post_processor.num_classes}, "
+          f"input: {post_processor.input_width}x{post_processor.input_height}")
+    print(f"{'Frames':>6}  {'Time/call':>10}  {'Time/frame':>11}  {'Frames/s':>9}  {'Detections/frame':>16}")
+    for frames in args.frames:
+        raw = gen_raw_outputs(post_processor, frames)
+        outputs = post_processor.split_outputs(raw)
+        elapsed = min(timeit.repeat(lambda: post_processor(outputs), number=1, repeat=args.repeat))
+        detections = post_processor(outputs)
+        print(f"{frames:>6}  {elapsed * 1000:>7.2f} ms  {elapsed * 1000 / frames:>8.3f} ms  "
+              f"{frames / elapsed:>9.1f}  {sum(len(d) for d in detections) / frames:>16.1f}")
+
+        if args.check:
+            args.check = False
+            for i, (result, expected) in enumerate(zip(detections, post_process_plain(post_processor, raw))):
+                assert result.shape == expected.shape and np.allclose(result, expected, rtol=1e-4, atol=1e-2), \
+                    f"The detections of frame {i} differ from the plain implementation."
+            print(f"{'':>6}  The detections match the plain implementation.")
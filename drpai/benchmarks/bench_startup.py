@@ -0,0 +1,98 @@
+"""
+Startup benchmark of the converter script, to catch regressions in its import time and the time it takes
+to write its first output file.
+
+It also reports the heavy modules that are loaded by just importing the script, which should be none.
+
+Example:
+    $ python3 benchmarks/bench_startup.py --deployment . --max-import-time 100
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import subprocess
+from typing import Tuple, List
+
+SCRIPT_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+SCRIPT_PATH = os.path.join(SCRIPT_DIRECTORY, "ei2gst_drpai.py")
+HEAVY_MODULES = ("numpy", "loguru", "tflite_runtime", "zipfile", "tarfile", "multiprocessing", "concurrent.futures")
+MODEL_NAME = "startup_benchmark"    # The model folder that is created in the deployment and removed afterward
+
+
+def measure_import_time() -> Tuple[float, List[str]]:
+    """
+    Imports the script in a fresh interpreter.
+
+    Returns:
+        (float, list[str]): The import time in seconds and the heavy modules that got loaded.
+    """
+    code = ("import sys, time\n"
+            "t = time.perf_counter()\n"
+            "import ei2gst_drpai\n"
+            "print(time.perf_counter() - t)\n"
+            f"print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))\n")
+    output = subprocess.run([sys.executable, "-c", code], cwd=SCRIPT_DIRECTORY, check=True,
+                            capture_output=True, text=True).stdout.split("\n")
+    return float(output[0]), [m for m in output[1].split(",") if m]
+
+
+def measure_first_output_time(deployment: str) -> Tuple[float, float]:
+    """
+    Runs a full conversion of a deployment in a fresh interpreter, ignoring the cache.
+
+    Args:
+        deployment (str): The path of the deployment directory or archive.
+
+    Returns:
+        (float, float): The wall time in seconds until the first output file is opened, and until the end.
+    """
+    if os.path.isdir(deployment):
+        working_directory, source = deployment, []
+    else:
+        working_directory, source = os.path.dirname(os.path.abspath(deployment)), ["--source", os.path.abspath(deployment)]
+    command = [sys.executable, SCRIPT_PATH, MODEL_NAME, "--force", "--jobs", "1"] + source
+    first_output_time = None
+    start_time = time.perf_counter()
+    process = subprocess.Popen(command, cwd=working_directory, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                               text=True)
+    for line in process.stderr:
+        if first_output_time is None and "Writing file:" in line:
+            first_output_time = time.perf_counter() - start_time
+    assert process.wait() == 0, "The conversion has failed."
+    total_time = time.perf_counter() - start_time
+    shutil.rmtree(os.path.join(working_directory, MODEL_NAME))
+    return first_output_time, total_time
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Startup benchmark of the converter script')
+    parser.add_argument('--deployment', help='A deployment directory or archive to also measure a full conversion.')
+    parser.add_argument('--repeat', type=int, default=5, help='The number of times to repeat each measurement.')
+    parser.add_argument('--max-import-time', type=float, help='Fail if the import takes longer (in milliseconds).')
+    parser.add_argument('--max-first-output-time', type=float,
+                        help='Fail if the first output file takes longer (in milliseconds).')
+    args = parser.parse_args()
+
+    failures = list()
+    measurements = [measure_import_time() for _ in range(args.repeat)]
+    import_time = min(t for t, _ in measurements)
+    loaded_modules = measurements[0][1]
+    print(f"Import time:           {import_time * 1000:8.1f} ms")
+    print(f"Heavy modules loaded:  {', '.join(loaded_modules) if loaded_modules else 'none'}")
+    if args.max_import_time is not None and import_time * 1000 > args.max_import_time:
+        failures.append(f"The import time is longer than {args.max_import_time} ms.")
+
+    if args.deployment is not None:
+        measurements = [measure_first_output_time(args.deployment) for _ in range(args.repeat)]
+        first_output_time = min(t for t, _ in measurements)
+        total_time = min(t for _, t in measurements)
+        print(f"Time to first output:  {first_output_time * 1000:8.1f} ms")
+        print(f"Total wall time:       {total_time * 1000:8.1f} ms")
+        if args.max_first_output_time is not None and first_output_time * 1000 > args.max_first_output_time:
+            failures.append(f"The time to the first output is longer than {args.max_first_output_time} ms.")
+
+    for failure in failures:
+        print(failure, file=sys.stderr)
+    sys.exit(1 if len(failures) > 0 else 0)
@@ -0,0 +1,352 @@
+"""
+Generates a synthetic EdgeImpulse DRPAI deployment of a configurable size, to benchmark the converter without
+a real model. It writes the same structure that `ei2gst_drpai.py` expects:
+
+    .
+    ├── model-parameters
+    │   ├── model_metadata.h
+    │   └── model_variables.h
+    └── tflite-model
+        └── drpai_model.h
+
+The C arrays of `drpai_model.h` are formatted like `xxd -i` and filled with random bytes, except the address map
+which is a valid text file and `yolov5.part2` which is a valid TFLite model that holds the YOLOv5 anchor tensors.
+A fraction of the weights can be zeroed in blocks, so they compress like sparse weights.
+
+The benchmarks that need a model folder get one from `generate_model_folder()`, which converts a synthetic
+deployment with `ei2gst_drpai.py`.
+
+Example:
+    $ python3 benchmarks/synthetic_deployment.py /tmp/deployment --size 256
+"""
+import os
+import sys
+import struct
+import argparse
+import subprocess
+import numpy as np
+from typing import List, Tuple, Dict, Optional, Callable
+
+VALUES_PER_LINE = 12    # The number of hex values in each line of a C array, like `xxd -i`
+CHUNK_LINES = 65536     # The number of lines to format at once while writing a C array
+ZERO_BLOCK_SIZE = 4096  # The size of the blocks of weights that are zeroed together
+
+SCRIPT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "ei2gst_drpai.py")
+
+# The YOLOv5 anchors of each grid size of a 640x640 input
+ANCHORS = {20: [[116, 90], [156, 198], [373, 326]],
+           40: [[30, 61], [62, 45], [59, 119]],
+           80: [[10, 13], [16, 30], [33, 23]]}
+
+# The other arrays of `drpai_model.h` and their sizes, next to the weights which fill the requested size
+DESCRIPTOR_SIZES = {"ei_drp_desc_bin": 16 * 1024, "ei_ei_drpcfg_mem": 512 * 1024,
+                    "ei_drp_param_bin": 8 * 1024, "ei_aimac_desc_bin": 4 * 1024}
+
+# A lookup table of the formatted text of each byte value
+HEX_TABLE = np.frombuffer("".join(f"0x{b:02x}, " for b in range(256)).encode(), dtype=np.uint8).reshape(256, 6)
+
+
+class FlatBufferWriter:
+    """
+    A minimal flatbuffer writer that lays out the objects from the front, which is enough to write small TFLite
+    models. Every table field takes 4 bytes, and the children of a table are written right after it.
+
+    The fields of a table are given as a list indexed by the field id of the schema, where each item is None
+    (not present), `("u8", value)`, `("u32", value)`, `("i32", value)` or `("ref", writer)`. A `writer` is a
+    function that writes the child object with this writer and returns its position.
+    """
+
+    def __init__(self):
+        self.buffer = bytearray(8)  # The root offset and the file identifier
+
+    def __align(self, alignment: int, extra: int = 0):
+        while (len(self.buffer) + extra) % alignment != 0:
+            self.buffer.append(0)
+
+    def finish(self, root: Callable[["FlatBufferWriter"], int], identifier: bytes) -> bytes:
+        self.buffer[4:8] = identifier
+        struct.pack_into("<I", self.buffer, 0, root(self))
+        return bytes(self.buffer)
+
+    def int32_vector(self, values: List[int]) -> int:
+        self.__align(4)
+        position = len(self.buffer)
+        self.buffer += struct.pack(f"<I{len(values)}i", len(values), *values)
+        return position
+
+    def byte_vector(self, data: bytes, alignment: int = 16) -> int:
+        self.__align(alignment, 4)
+        position = len(self.buffer)
+        self.buffer += struct.pack("<I", len(data)) + data
+        return position
+
+    def string(self, value: str) -> int:
+        self.__align(4)
+        position = len(self.buffer)
+        self.buffer += struct.pack("<I", len(value)) + value.encode() + b"\0"
+        return position
+
+    def table(self, fields: List[Optional[Tuple[str, object]]]) -> int:
+        self.__align(4)
+        vtable = len(self.buffer)
+        offsets = list()
+        for i, f in enumerate(fields):
+            offsets.append(0 if f is None else 4 + 4 * sum(1 for g in fields[:i] if g is not None))
+        self.buffer += struct.pack(f"<{2 + len(fields)}H", 4 + 2 * len(fields),
+                                   4 + 4 * sum(1 for f in fields if f is not None), *offsets)
+        self.__align(4)
+        position = len(self.buffer)
+        self.buffer += struct.pack("<i", position - vtable)
+        references = list()
+        for f in fields:
+            if f is None:
+                continue
+            kind, value = f
+            if kind == "u8":
+                self.buffer += struct.pack("<B3x", value)
+            elif kind == "u32":
+                self.buffer += struct.pack("<I", value)
+            elif kind == "i32":
+                self.buffer += struct.pack("<i", value)
+            else:
+                references.append((len(self.buffer), value))
+                self.buffer += bytes(4)
+        for field_position, writer in references:
+            struct.pack_into("<I", self.buffer, field_position, writer(self) - field_position)
+        return position
+
+    def table_vector(self, writers: List[Callable[["FlatBufferWriter"], int]]) -> int:
+        self.__align(4)
+        position = len(self.buffer)
+        self.buffer += struct.pack("<I", len(writers)) + bytes(4 * len(writers))
+        for i, writer in enumerate(writers):
+            item_position = position + 4 + 4 * i
+            struct.pack_into("<I", self.buffer, item_position, writer(self) - item_position)
+        return position
+
+
+def gen_tflite_model(tensors: List[Tuple[str, List[int], Optional[np.ndarray]]]) -> bytes:
+    """
+    Generates a TFLite model without operators. The first tensor is the input and output of the model,
+    and the others are constant float32 tensors.
+
+    Args:
+        tensors (list[(str, list[int], np.ndarray)]): The name, shape and data (or None) of each tensor.
+
+    Returns:
+        bytes: The content of the `.tflite` file.
+    """
+    def tensor(index: int, name: str, shape: List[int]):
+        return lambda w: w.table([("ref", lambda w: w.int32_vector(shape)), ("u8", 0), ("u32", index + 1),
+                                  ("ref", lambda w: w.string(name))])
+
+    def buffer(data: Optional[np.ndarray]):
+        if data is None:
+            return lambda w: w.table([])
+        return lambda w: w.table([("ref", lambda w: w.byte_vector(data.astype("<f4").tobytes()))])
+
+    def subgraph(w: FlatBufferWriter) -> int:
+        return w.table([("ref", lambda w: w.table_vector([tensor(i, n, s) for i, (n, s, _) in enumerate(tensors)])),
+                        ("ref", lambda w: w.int32_vector([0])), ("ref", lambda w: w.int32_vector([0])),
+                        ("ref", lambda w: w.table_vector([])), ("ref", lambda w: w.string("main"))])
+
+    def model(w: FlatBufferWriter) -> int:
+        return w.table([("u32", 3), ("ref", lambda w: w.table_vector([])),
+                        ("ref", lambda w: w.table_vector([subgraph])),
+                        ("ref", lambda w: w.string("synthetic yolov5.part2")),
+                        ("ref", lambda w: w.table_vector([lambda w: w.table([])] + [buffer(d) for _, _, d in tensors]))])
+
+    return FlatBufferWriter().finish(model, b"TFL3")
+
+
+def gen_part2(grids: List[int]) -> bytes:
+    """
+    Generates a `yolov5.part2` model that holds an anchor tensor of the shape `[1, 3, g, g, 2]` for each grid.
+
+    Args:
+        grids (list[int]): The grid sizes, which should be keys of `ANCHORS`.
+
+    Returns:
+        bytes: The content of the `.tflite` file.
+    """
+    tensors = [("input", [1, 3 * 85, grids[0], grids[0]], None)]
+    for g in grids:
+        anchors = np.array(ANCHORS[g], dtype=np.float32).reshape(1, 3, 1, 1, 2)
+        tensors.append((f"anchor_grid_{g}", [1, 3, g, g, 2], np.broadcast_to(anchors, (1, 3, g, g, 2))))
+    return gen_tflite_model(tensors)
+
+
+def gen_addrmap(sizes: Dict[str, int]) -> bytes:
+    """
+    Generates the text of the `addrmap_intm.txt` file with a `NAME HEX_ADDRESS HEX_SIZE` line per memory area.
+
+    Args:
+        sizes (dict[str, int]): The size of each memory area.
+
+    Returns:
+        bytes: The content of the text file.
+    """
+    address = 0x80000000
+    lines = list()
+    for name, size in sizes.items():
+        lines.append(f"{name} {address:08x} {size:08x}\n")
+        address += (size + 0xfff) & ~0xfff
+    return "".join(lines).encode()
+
+
+def write_c_array(f, name: str, chunks):
+    """
+    Writes a C array and its `_len` variable like `xxd -i`.
+
+    Args:
+        f (TextIO): The header file to write.
+        name (str): The name of the array.
+        chunks (Iterable[bytes]): The content of the array, in chunks of whole lines except the last one.
+    """
+    f.write(f"unsigned char {name}[] = {{\n")
+    length = 0
+    pending = b""
+    for chunk in chunks:
+        data = pending + chunk
+        # Keep the last line to write it without a trailing comma
+        cut = max(0, (len(data) - 1) // VALUES_PER_LINE * VALUES_PER_LINE)
+        pending = data[cut:]
+        if cut > 0:
+            lines = HEX_TABLE[np.frombuffer(data[:cut], dtype=np.uint8)].reshape(-1, VALUES_PER_LINE * 6)
+            text = np.full((lines.shape[0], VALUES_PER_LINE * 6 + 2), ord(" "), dtype=np.uint8)
+            text[:, 2:-1] = lines[:, :-1]
+            text[:, -1] = ord("\n")
+            f.write(text.tobytes().decode())
+        length += cut
+    f.write("  " + ", ".join(f"0x{b:02x}" for b in pending) + "\n};\n")
+    f.write(f"unsigned int {name}_len = {length + len(pending)};\n\n")
+
+
+def generate_deployment(directory: str, size: float, grids: List[int] = (20, 40, 80),
+                        labels: List[str] = ("apple", "banana"), input_size: int = 640, seed: int = 0,
+                        zeros: float = 0.0):
+    """
+    Generates a synthetic deployment in a directory.
+
+    Args:
+        directory (str): The directory to write the deployment in.
+        size (float): The approximate size of `drpai_model.h` in MB. Most of it is the weights.
+        grids (list[int]): The YOLOv5 output grid sizes.
+        labels (list[str]): The class labels.
+        input_size (int): The width and height of the input image.
+        seed (int): The seed of the random content.
+        zeros (float): The fraction of the `ZERO_BLOCK_SIZE` blocks of the weights that are zeros.
+    """
+    rng = np.random.default_rng(seed)
+    # Each line of the header holds `VALUES_PER_LINE` bytes
+    weight_size = int(size * 1024 * 1024 * VALUES_PER_LINE / (VALUES_PER_LINE * 6 + 2))
+    weight_size = max(VALUES_PER_LINE, weight_size - sum(DESCRIPTOR_SIZES.values()) - 200 * 1024)
+    part2 = gen_part2(list(grids))
+    addrmap = gen_addrmap({"data_in": input_size * input_size * 3, "data": 0x1000000,
+                           "data_out": sum(g * g * 3 * (5 + len(labels)) * 4 for g in grids), "work": 0x2000000,
+                           "weight": weight_size, "drp_config": DESCRIPTOR_SIZES["ei_ei_drpcfg_mem"],
+                           "drp_param": DESCRIPTOR_SIZES["ei_drp_param_bin"],
+                           "aimac_desc": DESCRIPTOR_SIZES["ei_aimac_desc_bin"],
+                           "drp_desc": DESCRIPTOR_SIZES["ei_drp_desc_bin"]})
+
+    def random_chunks(n: int, zeros: float = 0.0):
+        while n > 0:
+            chunk_size = min(n, CHUNK_LINES * VALUES_PER_LINE)
+            chunk = rng.integers(0, 256, chunk_size, dtype=np.uint8)
+            if zeros > 0:
+                blocks = rng.random(-(-chunk_size // ZERO_BLOCK_SIZE)) < zeros
+                chunk[np.repeat(blocks, ZERO_BLOCK_SIZE)[:chunk_size]] = 0
+            yield chunk.tobytes()
+            n -= chunk_size
+
+    os.makedirs(f"{directory}/tflite-model", exist_ok=True)
+    os.makedirs(f"{directory}/model-parameters", exist_ok=True)
+    with open(f"{directory}/tflite-model/drpai_model.h", "wt") as f:
+        f.write("#ifndef EI_DRPAI_MODEL_H\n#define EI_DRPAI_MODEL_H\n\n")
+        write_c_array(f, "ei_ei_addrmap_intm_txt", [addrmap])
+        for name, array_size in DESCRIPTOR_SIZES.items():
+            write_c_array(f, name, random_chunks(array_size))
+        write_c_array(f, "ei_ei_weight_dat", random_chunks(weight_size, zeros))
+        write_c_array(f, "ei_yolov5_part2", [part2])
+        for i, g in enumerate(grids):
+            f.write(f"const int NUM_GRID_{i + 1} = {g};\n")
+        f.write("\n#endif // EI_DRPAI_MODEL_H\n")
+
+    with open(f"{directory}/model-parameters/model_metadata.h", "wt") as f:
+        f.write("#ifndef _EI_CLASSIFIER_MODEL_METADATA_H_\n"
+                "#define _EI_CLASSIFIER_MODEL_METADATA_H_\n\n"
+                "#include <stdint.h>\n\n"
+                "#define EI_CLASSIFIER_NONE                       255\n"
+                "#define EI_CLASSIFIER_LAST_LAYER_FOMO            2\n"
+                "#define EI_CLASSIFIER_LAST_LAYER_YOLOV5          5\n\n"
+                "#define EI_CLASSIFIER_PROJECT_ID                 1\n"
+                f"#define EI_CLASSIFIER_NN_INPUT_FRAME_SIZE        {input_size * input_size * 3}\n"
+                f"#define EI_CLASSIFIER_INPUT_WIDTH                {input_size}\n"
+                f"#define EI_CLASSIFIER_INPUT_HEIGHT               {input_size}\n"
+                "#define EI_CLASSIFIER_INPUT_FRAMES               1\n"
+                f"#define EI_CLASSIFIER_LABEL_COUNT                {len(labels)}\n"
+                "#define EI_CLASSIFIER_HAS_ANOMALY                0\n"
+                "#define EI_CLASSIFIER_OBJECT_DETECTION           1\n"
+                "#define EI_CLASSIFIER_OBJECT_DETECTION_LAST_LAYER EI_CLASSIFIER_LAST_LAYER_YOLOV5\n\n"
+                "typedef struct {\n"
+                "    uint32_t blockId;\n"
+                "    int implementation_version;\n"
+                "    int length;\n"
+                "    const char * channels;\n"
+                "} ei_dsp_config_image_t;\n\n"
+                "#endif // _EI_CLASSIFIER_MODEL_METADATA_H_\n")
+
+    with open(f"{directory}/model-parameters/model_variables.h", "wt") as f:
+        f.write("#ifndef _EI_CLASSIFIER_MODEL_VARIABLES_H_\n"
+                "#define _EI_CLASSIFIER_MODEL_VARIABLES_H_\n\n"
+                "#include <stdint.h>\n"
+                "#include \"model_metadata.h\"\n\n"
+                f"const char* ei_classifier_inferencing_categories[] = {{ "
+                f"{', '.join(f'{chr(34)}{label}{chr(34)}' for label in labels)} }};\n\n"
+                "uint8_t ei_dsp_config_3_axes[] = { 0 };\n"
+                "const uint32_t ei_dsp_config_3_axes_size = 1;\n"
+                "ei_dsp_config_image_t ei_dsp_config_3 = {\n"
+                "    3, // uint32_t blockId\n"
+                "    1, // int implementationVersion\n"
+                "    1, // int length of axes\n"
+                "    \"RGB\" // select channels\n"
+                "};\n\n"
+                "const ei_object_detection_nms_config_t ei_object_detection_nms_config_5 = {\n"
+                "    0.5f, /* confidence threshold */\n"
+                "    0.45f /* iou threshold */\n"
+                "};\n\n"
+                "#endif // _EI_CLASSIFIER_MODEL_VARIABLES_H_\n")
+
+
+def generate_model_folder(directory: str, size: float, model_name: str = "model", **options) -> str:
+    """
+    Generates a synthetic deployment in a directory and converts it with `ei2gst_drpai.py` in a new process.
+
+    Args:
+        directory (str): The directory to write the deployment in.
+        size (float): The approximate size of `drpai_model.h` in MB.
+        model_name (str): The name of the model folder to create in the directory.
+        **options: The other arguments of `generate_deployment()`.
+
+    Returns:
+        str: The path of the model folder.
+    """
+    generate_deployment(directory, size, **options)
+    subprocess.run([sys.executable, SCRIPT_PATH, model_name, "--jobs", "1"], cwd=directory, check=True,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return os.path.join(directory, model_name)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Synthetic EdgeImpulse DRPAI deployment generator')
+    parser.add_argument('directory', help='The directory to write the deployment in.')
+    parser.add_argument('--size', type=float, default=1, help='The approximate size of drpai_model.h in MB.')
+    parser.add_argument('--grids', type=int, nargs='+', default=[20, 40, 80], choices=sorted(ANCHORS.keys()),
+                        help='The YOLOv5 output grid sizes.')
+    parser.add_argument('--labels', nargs='+', default=["apple", "banana"], help='The class labels.')
+    parser.add_argument('--seed', type=int, default=0, help='The seed of the random content.')
+    parser.add_argument('--zeros', type=float, default=0.0,
+                        help='The fraction of the 4 KB blocks of the weights that are zeros. (default: 0)')
+    args = parser.parse_args()
+
+    generate_deployment(args.directory, args.size, args.grids, args.labels, seed=args.seed, zeros=args.zeros)
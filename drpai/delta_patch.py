@@ -0,0 +1,280 @@
+"""
+The delta patch: the changes that turn the files of an old model folder into the files of a new one, so a
+retrained model can be updated over the air by sending only what has changed.
+
+The files are split by `content_defined_chunks()`, and the chunks that exist in the old files are referenced
+instead of being included. `create_patch()` writes the patch on the host and `apply_patch()` applies it on the
+board, after checking that the folder is the one the patch was made for.
+
+Example:
+    >>> stats = create_patch('yolov5-previous', 'yolov5', 'yolov5.patch')
+    >>> apply_patch('yolov5.patch', 'yolov5-previous')
+"""
+import os
+import mmap
+import json
+import struct
+import hashlib
+import contextlib
+from typing import List, Tuple, BinaryIO
+
+from model_bundle import COPY_CHUNK_SIZE, copy_file_data, is_plain_file_name
+
+# The content-defined chunking of `content_defined_chunks()`, which splits the files of a delta patch
+CDC_WINDOW = 48                     # The number of bytes that the rolling hash covers
+CDC_MIN_CHUNK = 2 * 1024
+CDC_AVERAGE_BITS = 13               # A boundary is expected every 2^13 = 8 KB
+CDC_MAX_CHUNK = 64 * 1024
+CDC_SEGMENT_SIZE = 1024 * 1024      # The number of bytes whose hashes are calculated at once, to bound the memory
+CDC_MULTIPLIER = 0x100000001B3      # The odd base of the polynomial rolling hash
+# The layout of a delta patch: a header, a JSON index of the files and the zlib-compressed literal data
+PATCH_MAGIC = b"EI2GSTP\0"
+PATCH_VERSION = 1
+PATCH_HEADER = struct.Struct("<8sHQ")           # magic, version, size of the JSON index
+
+
+@contextlib.contextmanager
+def map_file(file_path: str):
+    """
+    Maps a file in memory for reading.
+
+    Args:
+        file_path (str): The path of the file.
+
+    Yields:
+        mmap.mmap | bytes: The contents of the file. Empty files can't be mapped, so they are given as `b""`.
+    """
+    with open(file_path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            yield b""
+        else:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                yield mm
+
+
+def content_defined_chunks(data) -> List[Tuple[int, int]]:
+    """
+    Splits data into chunks whose boundaries depend on the content around them instead of their offsets,
+    so inserting or removing bytes only changes the chunks around the edit.
+
+    A boundary is placed after the bytes where a polynomial rolling hash of the last `CDC_WINDOW` bytes has its
+    top `CDC_AVERAGE_BITS` bits clear, keeping the chunks between `CDC_MIN_CHUNK` and `CDC_MAX_CHUNK`.
+    The window hash at each position `i` is `sum(g[j] * B^(i-j))` where `g` is a random value of each byte.
+    It is calculated for all positions at once with numpy, as the difference of two prefix sums of
+    `g[j] * B^-j`, multiplied back by `B^i`. All of it is modulo 2^64 by the wrapping of `uint64`.
+
+    Args:
+        data (bytes | mmap.mmap): The data to split.
+
+    Returns:
+        list[(int, int)]: The start and end offsets of each chunk.
+    """
+    import numpy as np
+    size = len(data)
+    if size <= CDC_MIN_CHUNK:
+        return [(0, size)] if size > 0 else []
+    array = np.frombuffer(data, dtype=np.uint8)
+    # The random value of each byte is derived from SHA-256, so the chunks are the same on every machine.
+    gear = np.array([int.from_bytes(hashlib.sha256(bytes([i])).digest()[:8], "little") for i in range(256)],
+                    dtype=np.uint64)
+    length = CDC_SEGMENT_SIZE + CDC_WINDOW
+    powers, inverses = (np.concatenate(([np.uint64(1)], np.cumprod(np.full(length - 1, base, dtype=np.uint64))))
+                        for base in (CDC_MULTIPLIER, pow(CDC_MULTIPLIER, -1, 2 ** 64)))    # B^i and B^-i
+    shift = np.uint64(64 - CDC_AVERAGE_BITS)
+
+    candidates = list()
+    for segment_start in range(CDC_WINDOW - 1, size, CDC_SEGMENT_SIZE):
+        # The hashes of positions [segment_start, segment_end) need the window of bytes before them as well.
+        segment_end = min(segment_start + CDC_SEGMENT_SIZE, size)
+        values = gear[array[segment_start - CDC_WINDOW + 1:segment_end]] * inverses[:segment_end - segment_start +
+                                                                                     CDC_WINDOW - 1]
+        prefix = np.concatenate(([np.uint64(0)], np.cumsum(values, dtype=np.uint64)))
+        # The window hash of each local position p >= CDC_WINDOW - 1 is
+        # (prefix[p + 1] - prefix[p + 1 - CDC_WINDOW]) * B^p
+        hashes = (prefix[CDC_WINDOW:] - prefix[:-CDC_WINDOW]) * powers[CDC_WINDOW - 1:len(values)]
+        found = np.flatnonzero((hashes >> shift) == 0)
+        candidates.extend((found + segment_start + 1).tolist())     # A boundary is right after the position
+
+    chunks = list()
+    start = 0
+    for boundary in candidates + [size]:
+        while boundary - start > CDC_MAX_CHUNK:
+            chunks.append((start, start + CDC_MAX_CHUNK))
+            start += CDC_MAX_CHUNK
+        if boundary - start >= CDC_MIN_CHUNK or boundary == size:
+            chunks.append((start, boundary))
+            start = boundary
+    return [chunk for chunk in chunks if chunk[1] > chunk[0]]
+
+
+def create_patch(old_directory: str, new_directory: str, patch_path: str) -> dict:
+    """
+    Writes a delta patch that turns the files of an old model folder into the files of a new one,
+    so a retrained model can be updated over the air by sending only what has changed.
+
+    Each new file is split by `content_defined_chunks()` and each chunk that exists anywhere in the old files
+    is referenced by its file name, offset and size instead of being included. The consecutive references are
+    merged, and the rest of the data is compressed with zlib. The patch starts with a `PATCH_HEADER` and a JSON
+    index of the SHA-256 of the old files it needs, and the size, SHA-256 and operations of each new file.
+    The compressed data is spooled into a temporary file as it is produced, as the index has to be written
+    before it, so the memory usage doesn't depend on the size of the files.
+
+    Args:
+        old_directory (str): The model folder that is deployed on the board.
+        new_directory (str): The model folder to update it to.
+        patch_path (str): The path of the patch file to write.
+
+    Returns:
+        dict: The `patch_size` and `new_size` in bytes, and the `reused` bytes that are copied from the old files.
+    """
+    import zlib
+    import tempfile
+
+    def list_files(directory: str) -> List[str]:
+        names = sorted(name for name in os.listdir(directory)
+                       if not name.startswith(".") and os.path.isfile(os.path.join(directory, name)))
+        for name in names:
+            assert is_plain_file_name(name), f"The file name {name} of a patch can't have a directory."
+        return names
+
+    # Index the chunks of all the old files by their hash.
+    old_files = dict()      # The SHA-256 of each old file
+    old_chunks = dict()     # The SHA-256 of a chunk -> (old file name, offset, size)
+    for name in list_files(old_directory):
+        with map_file(os.path.join(old_directory, name)) as data:
+            old_files[name] = hashlib.sha256(data).hexdigest()
+            for start, end in content_defined_chunks(data):
+                old_chunks.setdefault(hashlib.sha256(data[start:end]).digest(), (name, start, end - start))
+    old_names = {digest: name for name, digest in old_files.items()}
+
+    files = dict()
+    base = dict()
+    literal = zlib.compressobj(9)
+    literal_file = tempfile.TemporaryFile(dir=os.path.dirname(os.path.abspath(patch_path)))
+    literal_size = 0
+    new_size = 0
+    reused = 0
+    for name in list_files(new_directory):
+        operations = list()     # [old file name or None for the literal data, offset, size]
+        with map_file(os.path.join(new_directory, name)) as data:
+            file_size = len(data)
+            digest = hashlib.sha256(data).hexdigest()
+            if digest in old_names:
+                # The whole file exists in the old folder, maybe with another name.
+                chunks = [(0, len(data), (old_names[digest], 0, len(data)))] if len(data) > 0 else []
+            else:
+                chunks = [(start, end, old_chunks.get(hashlib.sha256(data[start:end]).digest()))
+                          for start, end in content_defined_chunks(data)]
+            for start, end, source in chunks:
+                if source is None:
+                    literal_file.write(literal.compress(data[start:end]))
+                    source = (None, literal_size, end - start)
+                    literal_size += end - start
+                else:
+                    base[source[0]] = old_files[source[0]]
+                    reused += end - start
+                last = operations[-1] if len(operations) > 0 else None
+                if last is not None and last[0] == source[0] and last[1] + last[2] == source[1]:
+                    last[2] += source[2]    # It continues the previous operation
+                else:
+                    operations.append(list(source))
+        new_size += file_size
+        files[name] = {"size": file_size, "sha256": digest, "operations": operations}
+    literal_file.write(literal.flush())
+
+    index = json.dumps({"base": base, "files": files,
+                        "deleted": [name for name in old_files if name not in files]}).encode()
+    with literal_file, open(patch_path, "wb") as f:
+        f.write(PATCH_HEADER.pack(PATCH_MAGIC, PATCH_VERSION, len(index)))
+        f.write(index)
+        f.flush()
+        literal_file.flush()
+        copy_file_data(literal_file.fileno(), 0, f.fileno(), f.tell(), literal_file.tell())
+    return {"patch_size": os.path.getsize(patch_path), "new_size": new_size, "reused": reused}
+
+
+def apply_patch(patch_path: str, directory: str):
+    """
+    Applies a delta patch written by `create_patch()` to a model folder.
+
+    The old files that the patch needs are verified first. Each new file is assembled in a temporary file
+    and hashed while it is written, and only when all of them match their SHA-256 they replace the old files.
+    So a wrong or corrupt patch leaves the folder as it was. The literal data is used in the order it was
+    written, so it is decompressed as a stream, and the memory usage doesn't depend on the size of the files.
+
+    Args:
+        patch_path (str): The path of the patch file.
+        directory (str): The model folder to update.
+
+    Raises:
+        AssertionError: If the patch is invalid, the folder is not the one it was made for, or a result
+            doesn't match its hash.
+    """
+    import zlib
+    with open(patch_path, "rb") as f:
+        magic, version, index_size = PATCH_HEADER.unpack(f.read(PATCH_HEADER.size))
+        assert magic == PATCH_MAGIC, f"{patch_path} is not a delta patch."
+        assert version == PATCH_VERSION, f"{patch_path} has an unsupported patch version {version}."
+        index = json.loads(f.read(index_size))
+    # The names are joined to `directory`, and the hashes only cover the contents, so they are checked here.
+    names = list(index["base"]) + list(index["files"]) + list(index["deleted"]) + \
+        [source for entry in index["files"].values() for source, _, _ in entry["operations"] if source is not None]
+    for name in names:
+        assert is_plain_file_name(name), f"{patch_path} has an invalid file name {name!r}."
+
+    for name, digest in index["base"].items():
+        file_path = os.path.join(directory, name)
+        assert os.path.isfile(file_path), f"{file_path} is not the file that {patch_path} was made for."
+        with map_file(file_path) as data:
+            assert hashlib.sha256(data).hexdigest() == digest, \
+                f"{file_path} is not the file that {patch_path} was made for."
+
+    decompressor = zlib.decompressobj()
+    literal_position = 0    # The offset of the next literal byte that the decompressor gives
+
+    def literal_blocks(literal: BinaryIO, offset: int, size: int):
+        # Yields the literal data of an operation in blocks of up to `COPY_CHUNK_SIZE` bytes
+        nonlocal literal_position
+        assert offset == literal_position, f"The literal data of {patch_path} is out of order."
+        literal_position += size
+        while size > 0:
+            compressed = decompressor.unconsumed_tail or literal.read(COPY_CHUNK_SIZE)
+            assert len(compressed) > 0, f"{patch_path} is truncated."
+            block = decompressor.decompress(compressed, min(size, COPY_CHUNK_SIZE))
+            size -= len(block)
+            yield block
+
+    temporary_files = list()
+    try:
+        with contextlib.ExitStack() as sources:
+            literal = sources.enter_context(open(patch_path, "rb"))
+            literal.seek(PATCH_HEADER.size + index_size)
+            mapped = dict()     # The mapped old files, by their names
+            for name, entry in index["files"].items():
+                temporary_path = os.path.join(directory, f"{name}.tmp")
+                temporary_files.append(temporary_path)
+                digest = hashlib.sha256()
+                with open(temporary_path, "wb") as writer:
+                    for source, offset, size in entry["operations"]:
+                        if source is None:
+                            blocks = literal_blocks(literal, offset, size)
+                        else:
+                            if source not in mapped:
+                                mapped[source] = sources.enter_context(map_file(os.path.join(directory, source)))
+                            blocks = [mapped[source][offset:offset + size]]
+                        for data in blocks:
+                            digest.update(data)
+                            writer.write(data)
+                assert os.path.getsize(temporary_path) == entry["size"] and digest.hexdigest() == entry["sha256"], \
+                    f"The patched {name} doesn't match its SHA-256."
+        from loguru import logger
+        for name in index["files"]:
+            logger.info(f"  Writing file: {os.path.join(directory, name)}")
+            os.replace(os.path.join(directory, f"{name}.tmp"), os.path.join(directory, name))
+        temporary_files = list()
+        for name in index["deleted"]:
+            os.remove(os.path.join(directory, name))
+    finally:
+        for temporary_path in temporary_files:
+            if os.path.exists(temporary_path):
+                os.remove(temporary_path)
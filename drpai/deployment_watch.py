@@ -0,0 +1,75 @@
+"""
+The watch mode of the converter: it polls the input directories of a deployment and calls a conversion whenever
+their files change and have settled, so new exports that are dropped into the directory are converted as soon as
+they are complete.
+
+Example:
+    $ python3 ei2gst_drpai.py yolov5 --watch --debounce 5
+"""
+import os
+import time
+import contextlib
+from typing import Callable, Dict, Tuple
+
+WATCHED_DIRECTORIES = ("model-parameters", "tflite-model")     # The input directories of `--watch`
+
+
+def snapshot_inputs(working_directory: str) -> Dict[str, Tuple[int, int]]:
+    """
+    Lists the files of the `WATCHED_DIRECTORIES` of a deployment with their size and modification time,
+    which is cheap enough to poll often and changes whenever a file is written, replaced or removed.
+
+    Args:
+        working_directory (str): The deployment directory.
+
+    Returns:
+        dict[str, (int, int)]: The `(size, mtime_ns)` of each file, by its path relative to the directory.
+    """
+    signatures = dict()
+    for directory in WATCHED_DIRECTORIES:
+        with contextlib.suppress(FileNotFoundError), os.scandir(f"{working_directory}/{directory}") as entries:
+            for entry in entries:
+                if entry.is_file():
+                    stat = entry.stat()
+                    signatures[f"{directory}/{entry.name}"] = (stat.st_size, stat.st_mtime_ns)
+    return signatures
+
+
+def watch_inputs(working_directory: str, convert: Callable[[Dict[str, Tuple[int, int]]], None],
+                 required_files: Tuple[str, ...], interval: float = 1.0, debounce: float = 2.0):
+    """
+    Calls `convert` whenever the input files of a deployment directory change, until the process is interrupted.
+
+    The `WATCHED_DIRECTORIES` are polled every `interval` seconds with `snapshot_inputs()`. A change is only
+    converted after the files have stayed the same for `debounce` seconds and all the `required_files` exist,
+    so a partially copied or extracted export is not converted. The first snapshot is converted as well.
+
+    A failed conversion is logged, and the watcher waits for the next change.
+
+    Args:
+        working_directory (str): The deployment directory.
+        convert (Callable): The conversion, which is called with the snapshot of the input files it converts.
+        required_files (tuple[str]): The paths of the input files, relative to the directory, that must exist.
+        interval (float): The seconds between the polls of the input files.
+        debounce (float): The seconds the input files must stay unchanged before they are converted.
+    """
+    from loguru import logger
+    converted = None        # The snapshot of the last conversion, even if it failed
+    pending = None          # The latest snapshot that differs from `converted`
+    changed_at = time.monotonic()
+    logger.info(f"Watching {', '.join(f'{working_directory}/{d}' for d in WATCHED_DIRECTORIES)} for changes")
+    while True:
+        signatures = snapshot_inputs(working_directory)
+        if signatures != pending:
+            pending, changed_at = signatures, time.monotonic()
+        if pending != converted and time.monotonic() - changed_at >= debounce:
+            converted = pending
+            missing = [name for name in required_files if name not in pending]
+            if len(missing) > 0:
+                logger.warning(f"Waiting for the missing input files: {', '.join(missing)}")
+            else:
+                try:
+                    convert(pending)
+                except Exception:
+                    logger.exception(f"Failed to convert {working_directory}, waiting for the next change")
+        time.sleep(interval)
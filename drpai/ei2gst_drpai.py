@@ -1,18 +1,106 @@
-import gc
+import io
 import os
+import sys
+import struct
+import json
+import time
 import argparse
-import tflite_runtime.interpreter as tflite
-import numpy as np
-from loguru import logger as logging
-from typing import Tuple, List
-
+import mmap
+import hashlib
+import binascii
+import itertools
+import re
+import contextlib
+from typing import Tuple, List, Dict, Union, Optional, BinaryIO, TYPE_CHECKING
+
+# The heavy modules (numpy, zipfile, tarfile, multiprocessing and concurrent.futures) are imported inside
+# the functions that need them, so the script starts fast and each stage only pays for what it uses.
+# The modules of the optional features next to the script (model_bundle, delta_patch, artifact_compression,
+# part2_benchmark and deployment_watch) are imported the same way, so a plain conversion only needs this file.
+if TYPE_CHECKING:
+    import numpy as np
+    from multiprocessing.connection import Connection
+
+
+class LazyLogger:
+    """
+    Stands in for the loguru logger and imports loguru at the first use, as it is slower to import than
+    everything else in the script. So the commands that don't log anything never pay for it.
+    """
 
-def csv_2_bytearray(s: str) -> bytearray:
+    def __getattr__(self, name: str):
+        global logging
+        from loguru import logger
+        logging = logger
+        return getattr(logger, name)
+
+
+logging = LazyLogger()
+
+
+HEX_WHITESPACE = b" \t\r\n"          # The characters around the hex values and commas of a C array
+# The table of `bytes.translate()` that turns the whitespace and commas into `,` and the characters of values into `a`
+HEX_SEPARATOR_TABLE = bytes(ord(",") if c in HEX_WHITESPACE + b"," else ord("a") for c in range(256))
+HEX_CHUNK_SIZE = 4 * 1024 * 1024    # The number of hex text bytes to decode at once while streaming a binary file
+HASH_CHUNK_SIZE = 1024 * 1024       # The number of bytes to read at once while hashing a file
+CACHE_VERSION = 3                   # Increase it when the outputs of the same inputs change, to invalidate old caches
+
+ARCHIVE_EXTENSIONS = (".tar.gz", ".tgz", ".tar", ".zip")
+
+DRPAI_MODEL_FILE = "tflite-model/drpai_model.h"
+MODEL_METADATA_FILE = "model-parameters/model_metadata.h"
+MODEL_VARIABLES_FILE = "model-parameters/model_variables.h"
+
+MANIFEST_VERSION = 1
+# The memory regions of `model_addrmap_intm.txt` that the model files are loaded into, where `{}` is the model name
+ADDRMAP_FILES = {
+    "weight": "{}_weight.dat",
+    "drp_config": "{}_drpcfg.mem",
+    "drp_param": "drp_param.bin",
+    "aimac_desc": "aimac_desc.bin",
+    "drp_desc": "drp_desc.bin",
+}
+
+# The numpy types of the TFLite `TensorType` enum values that can hold anchors
+TFLITE_TENSOR_TYPES = {0: "<f4", 1: "<f2", 2: "<i4", 3: "u1", 4: "<i8", 7: "<i2", 9: "i1"}
+
+# The tokens of the C header files. Whitespace, comments and preprocessor directives other than `#define KEY VALUE`
+# are matched without a group, so they are skipped.
+C_TOKEN_PATTERN = re.compile(r"""
+      \s+ | //[^\n]* | /\*.*?\*/
+    | \#[ \t]*define[ \t]+(?P<define>\w+)[ \t]+(?P<define_value>\S+)[ \t\r]*(?://[^\n]*|/\*.*?\*/)?[ \t\r]*$
+    | \#(?:[^\n\\]|\\.)*
+    | (?P<string>"(?:[^"\\\n]|\\.)*")
+    | (?P<number>[-+]?(?:0[xX][0-9a-fA-F]+|(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)[uUlLfF]*)
+    | (?P<name>[A-Za-z_]\w*)
+    | (?P<symbol>\S)
+""", re.VERBOSE | re.DOTALL | re.MULTILINE)
+C_QUALIFIERS = {"const", "static", "volatile", "extern", "signed", "unsigned", "struct"}
+# The structs that are defined in `edge-impulse-sdk` instead of `model_metadata.h`, with their member names
+SDK_STRUCTS = {
+    "ei_object_detection_nms_config_t": ["confidence_threshold", "iou_threshold"],
+}
+VARIABLE_TABLE_VERSION = 2          # Increase it when the parser changes, to invalidate old variable tables
+
+CValue = Union[int, float, str, list]   # The Python type of a parsed C value
+
+# A compressed artifact is a standard `.gz` or `.xz` file made of a gzip member or xz stream per independently
+# compressed chunk, see `artifact_compression.py`. Only the files loaded into the memory regions are compressed.
+COMPRESSION_EXTENSIONS = {"gzip": ".gz", "xz": ".xz"}   # The suffix of each codec
+COMPRESSION_CODECS = list(COMPRESSION_EXTENSIONS)
+
+
+def csv_2_bytearray(s: Union[str, bytes, bytearray, memoryview]) -> bytearray:
     """
     Converts a comma-separated string of hex values to a bytearray.
 
+    The whole input is decoded in bulk by `binascii.unhexlify()`, so it can be a single line or a complete
+    C array body with newlines, mixed spacing and trailing commas. Values that are not written with exactly
+    two hex digits (e.g. `0x5`) or that are split by whitespace (e.g. `0x1 2`) fall back to a slower token by
+    token conversion, which raises a `ValueError` for the latter.
+
     Args:
-        s (str): A string containing comma-separated hex values to be converted to a bytearray.
+        s (str | bytes): A string containing comma-separated hex values to be converted to a bytearray.
 
     Returns:
         bytearray: A bytearray representing the hex values, suitable for writing to a binary file.
@@ -21,61 +109,721 @@ def csv_2_bytearray(s: str) -> bytearray:
         >>> csv_2_bytearray('0x84, 0xa0, 0x1c, 0xa6, 0x9e, 0x2c, 0xb1, 0xa3, 0x22, 0xa7, 0xa6, 0x23,')
         bytearray(b'\x84\xa0\x1c\xa6\x9e,\xb1\xa3"\xa7\xa6#')
     """
-    c = 0
-    array = []
-    while c < len(s):
-        i = s.find(",", c)
-        substr = s[c:i] if i != -1 else s[c:]
-        value = int(substr.strip(), 16)
-        array.append(value)
-        c += len(substr)+1
-    r = bytearray(array)
-    return r
+    data = s.encode("ascii") if isinstance(s, str) else bytes(s)
+    # Without the whitespace, each value must be exactly `0xHH,` for the bulk decoding, which is checked
+    # on every value by looking at each of the 5 positions with a strided slice.
+    values = data.translate(None, HEX_WHITESPACE)
+    if not values.endswith(b","):
+        values += b","
+    count = len(values) // 5
+    # Removing the whitespace must not join the pieces of a split value either. Then each value is a run of
+    # 4 characters between the separators, as no run can be longer than `0xHH` once the strides match.
+    if len(values) == 5 * count and values[0::5] == b"0" * count and values[4::5] == b"," * count \
+            and values[1::5].lower() == b"x" * count and data.translate(HEX_SEPARATOR_TABLE).count(b"aaaa") == count:
+        # Keep only the two hex digits of each value, picked by their positions.
+        digits = bytearray(2 * count)
+        digits[0::2] = values[2::5]
+        digits[1::2] = values[3::5]
+        return bytearray(binascii.unhexlify(digits))
+    return bytearray(int(token, 16) for token in data.split(b",") if token.strip())
+
+
+def release_mapped_pages(mm: mmap.mmap, start: int, end: int):
+    """
+    Drops the pages of a read-only memory map between `start` and `end` from the resident memory of the process.
+    They are still in the page cache of the OS and will be mapped back if they are accessed again.
+
+    Args:
+        mm (mmap.mmap): The memory map.
+        start (int): The byte offset to start from. It is rounded down to the page size.
+        end (int): The byte offset to end at.
+    """
+    if hasattr(mmap, "MADV_DONTNEED"):     # Not available on all platforms
+        start -= start % mmap.PAGESIZE
+        if end > start:
+            mm.madvise(mmap.MADV_DONTNEED, start, end - start)
 
 
-def get_grid_anchors(interpreter: tflite.Interpreter, grids: List[int]) -> Tuple[int, list]:
+def extract_hex_array(file_path: str, start: int, end: int, output_file_path: str,
+                      compression: Optional[str] = None, threads: int = 1, buffer: Optional[bytearray] = None,
+                      write_file: bool = True) -> Tuple[int, str]:
     """
-    Retrieves grid anchors from the TensorFlow Lite interpreter.
+    Converts the hex values of a C array body to binary and streams them into a file.
+    The SHA-256 of the file is calculated along the way, so it doesn't have to be read again.
+    With a `compression` codec, the binary is compressed by the `ChunkedCompressor` of `artifact_compression.py`
+    as it is decoded, so the uncompressed file is never written.
+
+    The file is memory-mapped and the body is handed to the decoder as `memoryview` slices of `HEX_CHUNK_SIZE`
+    which are cut after the last comma, so no value is split and no line is decoded into a Python `str`.
+    It is a module-level function so that it can be run by the workers of a process pool.
+
+    Args:
+        file_path (str): The path of the C header file.
+        start (int): The byte offset of the first hex value of the array body.
+        end (int): The byte offset of the closing bracket of the array body.
+        output_file_path (str): The path of the binary file to write.
+        compression (str): The codec of `COMPRESSION_CODECS` to compress the file with, or None.
+        threads (int): The number of threads to compress the chunks in parallel.
+        buffer (bytearray): A buffer to also collect the contents of the file in memory, if any.
+        write_file (bool): Whether to write the file, or only fill the `buffer`.
 
-    This method iterates through the tensors in the interpreter to find a tensor
-    that matches the shape corresponding to one of the provided grids. It returns
-    the grid size and the anchor values if a matching tensor is found.
+    Returns:
+        (int, str): The number of decoded bytes and the hex digest of the SHA-256 of the written file.
+    """
+    output_file_size = 0
+    written = dict()    # The size and digest of the written file, given by `HashingWriter` when it is closed
+    writer = HashingWriter(output_file_path, lambda _, size, digest: written.update(size=size, digest=digest),
+                           buffer, write_file)
+    if compression is not None:
+        from artifact_compression import ChunkedCompressor
+        writer = ChunkedCompressor(writer, compression, threads)
+    with open(file_path, "rb") as f, writer, \
+            mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm, memoryview(mm) as view:
+        while start < end:
+            cut = mm.rfind(b",", start, start + HEX_CHUNK_SIZE) + 1 if start + HEX_CHUNK_SIZE < end else end
+            if cut <= start:
+                cut = end   # There is no comma in the chunk, so decode the rest at once
+            with view[start:cut] as chunk:
+                data = csv_2_bytearray(chunk)
+            writer.write(data)
+            output_file_size += len(data)
+            release_mapped_pages(mm, start, cut)
+            start = cut
+    return output_file_size, written["digest"]
+
+
+def artifact_codec(file_path: str) -> Optional[str]:
+    """
+    Returns the codec that a generated file is compressed with, from the suffix of its name.
 
     Args:
-        interpreter (tflite.Interpreter): The TensorFlow Lite interpreter.
+        file_path (str): The path or name of the file.
+
+    Returns:
+        str: The codec of `COMPRESSION_CODECS`, or None if the file is not compressed.
+    """
+    return next((codec for codec, extension in COMPRESSION_EXTENSIONS.items() if file_path.endswith(extension)), None)
+
+
+def resource_usage() -> Tuple[float, int]:
+    """
+    Returns the resource usage of the process for the measurements of the stages.
+    The `resource` module is imported here, as it only exists on Unix, so the script can still run elsewhere.
+
+    Returns:
+        (float, int): The CPU time of the process and its children in seconds, and the peak resident memory
+            of the process in KB. Both are 0 where the `resource` module is not available.
+    """
+    try:
+        import resource
+    except ImportError:
+        return 0.0, 0
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime, own.ru_maxrss
+
+
+def sha256_file(file_path: str) -> str:
+    """
+    Calculates the SHA-256 hash of a file without loading it all in memory.
+
+    Args:
+        file_path (str): The path of the file to hash.
+
+    Returns:
+        str: The hex digest of the hash.
+    """
+    h = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+class HashingWriter(io.RawIOBase):
+    """
+    Writes a binary file and calculates the SHA-256 and size of the data as it is written, so the outputs
+    don't have to be read again to be hashed. Wrap it in `io.BufferedWriter` and `io.TextIOWrapper` to write text.
+
+    Parameters:
+        file_path (str): The path of the file to write.
+        on_close (Callable): A function that is called with the `file_path`, size and hex digest of the file
+            when it is closed.
+        buffer (bytearray): A buffer to also collect the data in memory, if any.
+        write_file (bool): Whether to write the file. Without it, the data only goes to the `buffer`.
+    """
+
+    def __init__(self, file_path: str, on_close, buffer: Optional[bytearray] = None, write_file: bool = True):
+        super().__init__()
+        self.file_path = file_path
+        self.on_close = on_close
+        self.buffer = buffer
+        self.file = open(file_path, "wb") if write_file else None
+        self.digest = hashlib.sha256()
+        self.size = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self.digest.update(data)
+        self.size += len(data)
+        if self.buffer is not None:
+            self.buffer += data
+        return self.file.write(data) if self.file is not None else len(data)
+
+    def close(self):
+        if not self.closed:
+            if self.file is not None:
+                self.file.close()
+            self.on_close(self.file_path, self.size, self.digest.hexdigest())
+        super().close()
+
+
+def verify_manifest(directory: str, workers: int = 1) -> Optional[str]:
+    """
+    Verifies the files of a model folder against its `*_manifest.json` file written by `gen_manifest()`.
+
+    The sizes are compared first, as it is cheap. Then the files are hashed by a pool of threads, the largest
+    first, and the verification stops at the first mismatch without waiting for the other hashes.
+
+    Args:
+        directory (str): The model folder. The folder may have been renamed since the manifest was written.
+        workers (int): The number of files to hash in parallel.
+
+    Returns:
+        str | None: The description of the first mismatch, or None if all the files match.
+
+    Raises:
+        AssertionError: If there isn't exactly one manifest file in the folder.
+    """
+    import threading
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+    manifests = [name for name in os.listdir(directory) if name.endswith("_manifest.json")]
+    assert len(manifests) == 1, f"{directory} should have exactly one manifest file, but it has {len(manifests)}."
+    with open(os.path.join(directory, manifests[0]), "rt") as f:
+        files = json.load(f)["files"]
+    for name, entry in files.items():
+        file_path = os.path.join(directory, name)
+        if not os.path.isfile(file_path):
+            return f"{file_path} is missing."
+        if os.path.getsize(file_path) != entry["size"]:
+            return f"{file_path} has a size of {os.path.getsize(file_path)} instead of {entry['size']} bytes."
+
+    stop = threading.Event()    # Set at the first mismatch, so the running hashes are abandoned
+
+    def hash_file(file_path: str) -> Optional[str]:
+        h = hashlib.sha256()
+        with open(file_path, "rb") as f:
+            for block in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+                if stop.is_set():
+                    return None
+                h.update(block)
+        return h.hexdigest()
+
+    names = sorted(files, key=lambda n: files[n]["size"], reverse=True)
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        futures = {executor.submit(hash_file, os.path.join(directory, name)): name for name in names}
+        for future in as_completed(futures):
+            name = futures[future]
+            if future.result() != files[name]["sha256"]:
+                stop.set()
+                for pending in futures:
+                    pending.cancel()
+                return f"{os.path.join(directory, name)} doesn't match its SHA-256 in the manifest."
+    return None
+
+
+def index_tflite_tensors(model: bytes) -> Dict[Tuple[int, ...], Tuple[int, "np.ndarray"]]:
+    """
+    Indexes the constant tensors of a TFLite model by their shape, by reading its flatbuffer directly.
+    It is much faster than creating a `tflite.Interpreter` and allocating all of its tensors.
+
+    Only the main subgraph is indexed, which is the one `tflite.Interpreter.get_tensor()` looks at,
+    and only the tensors that have their data in a buffer, either inside the flatbuffer or appended after it.
+
+    Args:
+        model (bytes): The content of the `.tflite` model file.
+
+    Returns:
+        dict[tuple[int], (int, np.ndarray)]: The tensor index and the array of the first constant tensor
+            of each shape.
+
+    Example:
+        >>> with open('yolov5.part2', 'rb') as f:
+        ...     tensors = index_tflite_tensors(f.read())
+        >>> tensors[(1, 3, 20, 20, 2)][1][0][0][0][0]
+        array([116.,  90.], dtype=float32)
+    """
+    import numpy as np
+
+    def u32(position: int) -> int:
+        return struct.unpack_from("<I", model, position)[0]
+
+    def field(table: int, field_id: int) -> int:
+        # Returns the position of a table field, or 0 if it is not present
+        vtable = table - struct.unpack_from("<i", model, table)[0]
+        vtable_size = struct.unpack_from("<H", model, vtable)[0]
+        if 4 + 2 * field_id >= vtable_size:
+            return 0
+        offset = struct.unpack_from("<H", model, vtable + 4 + 2 * field_id)[0]
+        return table + offset if offset != 0 else 0
+
+    def reference(table: int, field_id: int) -> int:
+        # Follows an offset field to its table, vector or string, or returns 0 if it is not present
+        position = field(table, field_id)
+        return position + u32(position) if position != 0 else 0
+
+    def vector_items(vector: int) -> List[int]:
+        # Returns the positions of the offset items in a vector of tables
+        return [vector + 4 + 4 * i + u32(vector + 4 + 4 * i) for i in range(u32(vector))] if vector != 0 else []
+
+    root = u32(0)
+    subgraphs = vector_items(reference(root, 2))    # Model.subgraphs
+    buffers = vector_items(reference(root, 4))      # Model.buffers
+    tensors = dict()
+    for tensor_index, tensor in enumerate(vector_items(reference(subgraphs[0], 0))):     # SubGraph.tensors
+        shape_vector = reference(tensor, 0)                                             # Tensor.shape
+        shape = struct.unpack_from(f"<{u32(shape_vector)}i", model, shape_vector + 4) if shape_vector != 0 else ()
+        tensor_type = model[field(tensor, 1)] if field(tensor, 1) != 0 else 0           # Tensor.type
+        buffer_index = u32(field(tensor, 2)) if field(tensor, 2) != 0 else 0            # Tensor.buffer
+        if shape in tensors or tensor_type not in TFLITE_TENSOR_TYPES or buffer_index >= len(buffers):
+            continue
+
+        buffer = buffers[buffer_index]
+        data = reference(buffer, 0)                                                     # Buffer.data
+        if data != 0 and u32(data) > 0:
+            start, size = data + 4, u32(data)
+        elif field(buffer, 1) != 0 and field(buffer, 2) != 0:
+            # The data is appended after the flatbuffer (Buffer.offset and Buffer.size)
+            start, size = struct.unpack_from("<QQ", model, field(buffer, 1))[0], \
+                struct.unpack_from("<Q", model, field(buffer, 2))[0]
+        else:
+            continue    # It is not a constant tensor
+
+        array = np.frombuffer(model, dtype=TFLITE_TENSOR_TYPES[tensor_type], count=int(np.prod(shape)), offset=start)
+        if array.nbytes == size:
+            tensors[shape] = (tensor_index, array.reshape(shape))
+    return tensors
+
+
+def get_grid_anchors(tensors: Dict[Tuple[int, ...], Tuple[int, "np.ndarray"]], grids: List[int]) \
+        -> List[Tuple[int, list]]:
+    """
+    Retrieves grid anchors from the constant tensors of a TFLite model.
+
+    This method looks up the tensor with the shape of `[1, 3, grid, grid, 2]` for each of the provided grids
+    and returns the grid sizes and their anchor values in the order of the tensors in the model.
+
+    Args:
+        tensors (dict): The constant tensors of the model indexed by `index_tflite_tensors()`.
         grids (list[int]): A list of grid sizes to search for.
 
     Returns:
-        (int, list[list[int]]): The first found grid size and its list of anchor values.
+        list[(int, list[list[float]])]: Each grid size and its list of anchor values.
 
     Raises:
-        ValueError: If no anchors are found for the provided grids in the interpreter.
+        Exception: If no anchors are found for any of the provided grids in the model.
 
     Example:
-        >>> interpreter = tflite.Interpreter(model_path='yolov5.part2')
-        >>> grids = [20, 40, 80]
-        >>> __get_grid_anchors(interpreter, grids)
-        [[116.0, 90.0], [156.0, 198.0], [373.0, 326.0]]
+        >>> get_grid_anchors(tensors, [20])
+        [(20, [[116.0, 90.0], [156.0, 198.0], [373.0, 326.0]])]
     """
-    tensor_index = 0
+    found = list()
+    for g in grids:
+        if (1, 3, g, g, 2) not in tensors:
+            raise Exception(f"No anchors found for the grid {g} in the model.")
+        tensor_index, tensor = tensors[(1, 3, g, g, 2)]
+        found.append((tensor_index, g, [list(tensor[0][j][0][0]) for j in range(3)]))
+    return [(g, anchors) for _, g, anchors in sorted(found, key=lambda item: item[0])]
 
-    # Loop through all tensors
-    # Note: ValueError is raised if tensor_index is out of bounds
-    while True:
-        try:
-            # Get the tensor and its shape at the current index
-            tensor = interpreter.get_tensor(tensor_index)
-            shape = tensor.shape
-            tensor_index += 1
 
-            # Check if the tensor shape matches any of the provided grid sizes
-            for g in grids:
-                if np.array_equal(shape, [1, 3, g, g, 2]):
-                    # Return the found grid and anchor values
-                    return g, [list(tensor[0][j][0][0]) for j in range(3)]
+def c_literal(text: str) -> CValue:
+    """
+    Converts the text of a C value to its Python type.
+
+    Args:
+        text (str): The C value, such as `640`, `0x1F`, `0.45f`, `"RGB"` or `EI_CLASSIFIER_LAST_LAYER_YOLOV5`.
+
+    Returns:
+        int | float | str: An integer or float for numbers, the contents of string literals without the quotes,
+            and the text itself for anything else like names and expressions.
+
+    Example:
+        >>> [c_literal(v) for v in ('640', '0x1F', '0.45f', '"RGB"', 'EI_CLASSIFIER_LAST_LAYER_YOLOV5')]
+        [640, 31, 0.45, 'RGB', 'EI_CLASSIFIER_LAST_LAYER_YOLOV5']
+    """
+    match = C_TOKEN_PATTERN.fullmatch(text)
+    if match is None:
+        return text
+    elif match.lastgroup == "number":
+        if text.lstrip("+-")[:2].lower() == "0x":
+            return int(text.rstrip("uUlL"), 16)
+        number = text.rstrip("uUlLfF")
+        return float(number) if any(c in number for c in ".eE") else int(number)
+    elif match.lastgroup == "string":
+        return text[1:-1]
+    return text
+
+
+class CHeaderParser:
+    """
+    Parses the `#define` macros, struct definitions and variable initializations of a C header file
+    in a single pass over the tokens of `C_TOKEN_PATTERN`.
 
-        except ValueError:
-            raise Exception("No anchors found for the provided grids not found in the interpreter.")
+    The scalar values are converted by `c_literal()` and the array and struct initializers become lists.
+    When a variable of a known struct type is initialized, each value is stored with the name of its
+    member prefixed by the struct type, e.g. `ei_dsp_config_image_t_channels`. The member names are looked up
+    in the `structs` index, which is filled by the struct definitions of the parsed headers.
+
+    Parameters:
+        structs (dict[str, list[str]]): The member names of each struct type, in the order of their declarations.
+    """
+
+    def __init__(self, structs: Dict[str, List[str]]):
+        self.structs = structs
+        self.variables = dict()     # The parsed values by their names
+        self.tokens = list()        # The (kind, text, start, end) of each token of the header being parsed
+        self.position = 0           # The index of the next token to parse
+        self.text = ""              # The header being parsed
+
+    def parse(self, text: str) -> Dict[str, CValue]:
+        """
+        Parses a C header file and adds its values to `variables`.
+
+        Args:
+            text (str): The contents of the header file.
+
+        Returns:
+            dict[str, int | float | str | list]: The `variables` parsed so far.
+        """
+        self.text = text
+        self.tokens = list()
+        self.position = 0
+        for match in C_TOKEN_PATTERN.finditer(text):
+            if match.lastgroup == "define_value":
+                # It is a define macro with the grammar `#define KEY VALUE`
+                self.variables[match.group("define")] = c_literal(match.group("define_value"))
+            elif match.lastgroup is not None:
+                self.tokens.append((match.lastgroup, match.group(), match.start(), match.end()))
+        while self.position < len(self.tokens):
+            self.__parse_statement()
+        return self.variables
+
+    def __next_symbol(self, symbols: str) -> List[tuple]:
+        """
+        Consumes the tokens up to one of the given symbols, skipping any nested `{}` blocks.
+
+        Args:
+            symbols (str): The characters of the symbols to stop at.
+
+        Returns:
+            list[tuple]: The consumed tokens, ending with the found symbol unless the header has ended.
+        """
+        tokens = list()
+        while self.position < len(self.tokens):
+            token = self.tokens[self.position]
+            self.position += 1
+            tokens.append(token)
+            if token[0] == "symbol" and token[1] in symbols:
+                break
+            if token[1] == "{":
+                self.__next_symbol("}")
+        return tokens
+
+    def __parse_statement(self):
+        """
+        Parses a top-level declaration, up to its `;` or the end of its `{}` block.
+        """
+        declaration = self.__next_symbol("=;{}")
+        names = [text for kind, text, _, _ in declaration if kind == "name"]
+        end = declaration[-1][1]
+        if end == "{" and names[:2] == ["typedef", "struct"]:
+            self.__parse_struct_definition()
+        elif end == "{" and names[:1] != ["extern"]:
+            self.__next_symbol("}")     # A function body or a union/enum/class definition that we don't need
+        elif end == "=":
+            # The declaration looks like `const TYPE NAME = VALUE;` or `TYPE NAME[SIZE] = { VALUES };`
+            name = self.__declared_name(declaration)
+            type_name = next((n for n in names if n not in C_QUALIFIERS), None)
+            value = self.__parse_initializer()
+            self.__next_symbol(";")
+            if any(text == "[" for _, text, _, _ in declaration):
+                self.variables[name] = value if isinstance(value, list) else [value]
+            elif type_name in self.structs and isinstance(value, (list, dict)):
+                # Assign the values to the member names that we know from the struct definition.
+                members = value.items() if isinstance(value, dict) else zip(self.structs[type_name], value)
+                for member, member_value in members:
+                    self.variables[f"{type_name}_{member}"] = member_value
+            elif not isinstance(value, (list, dict)):
+                self.variables[name] = value
+
+    @staticmethod
+    def __declared_name(declaration: List[tuple]) -> Optional[str]:
+        """
+        Finds the name of a declared variable or struct member, which is the last word before any brackets.
+
+        Args:
+            declaration (list[tuple]): The tokens of the declaration.
+
+        Returns:
+            str | None: The declared name, or None if there are no words.
+        """
+        texts = [text for _, text, _, _ in declaration]
+        cut = texts.index("[") if "[" in texts else len(texts)
+        names = [text for kind, text, _, _ in declaration[:cut] if kind == "name"]
+        return names[-1] if len(names) > 0 else None
+
+    def __parse_struct_definition(self):
+        """
+        Parses the members of a `typedef struct { TYPE NAME; ... } NAME;` definition into the `structs` index.
+        """
+        members = list()
+        while True:
+            declaration = self.__next_symbol(";}")
+            if len(declaration) == 0 or declaration[-1][1] == "}":
+                break
+            # The member looks like `type name;`, `type * name;`, `type *name;` or `type name[SIZE];`
+            name = self.__declared_name(declaration)
+            if name is not None:
+                members.append(name)
+        names = [text for kind, text, _, _ in self.__next_symbol(";") if kind == "name"]
+        if len(names) > 0:
+            self.structs[names[0]] = members
+
+    def __parse_initializer(self) -> Union[CValue, dict]:
+        """
+        Parses the value of an initialization, which is a scalar, an expression or a `{}` list of them.
+        Designated initializers like `{ .NAME = VALUE }` become a dictionary.
+
+        Returns:
+            int | float | str | list | dict: The value.
+        """
+        if self.position >= len(self.tokens):
+            return None
+        _, text, start, _ = self.tokens[self.position]
+        if text != "{":
+            tokens = list()
+            depth = 0   # The depth of parentheses, to keep the commas of function calls in the expression
+            while self.position < len(self.tokens):
+                token = self.tokens[self.position]
+                if depth == 0 and token[0] == "symbol" and token[1] in ",;}":
+                    break
+                depth += 1 if token[1] == "(" else -1 if token[1] == ")" else 0
+                tokens.append(token)
+                self.position += 1
+            if len(tokens) == 1:
+                return c_literal(tokens[0][1])
+            if len(tokens) > 1 and all(token[0] == "string" for token in tokens):
+                return "".join(token[1][1:-1] for token in tokens)     # Adjacent string literals are joined
+            return self.text[start:tokens[-1][3]] if len(tokens) > 0 else None
+
+        self.position += 1
+        values = list()
+        designated = dict()
+        while self.position < len(self.tokens) and self.tokens[self.position][1] != "}":
+            if self.tokens[self.position][1] == "." and self.position + 2 < len(self.tokens) and \
+                    self.tokens[self.position + 2][1] == "=":
+                member = self.tokens[self.position + 1][1]
+                self.position += 3
+                designated[member] = self.__parse_initializer()
+            else:
+                values.append(self.__parse_initializer())
+            if self.position < len(self.tokens) and self.tokens[self.position][1] == ",":
+                self.position += 1
+        self.position += 1
+        return designated if len(designated) > 0 else values
+
+
+class DeploymentArchive:
+    """
+    Reads the files of a `.zip` or `.tar.gz` EdgeImpulse deployment without extracting it on the disk.
+
+    The members are looked up by their path relative to the deployment root, e.g. `tflite-model/drpai_model.h`,
+    so it doesn't matter if the archive has a top-level directory or not.
+
+    Parameters:
+        archive_path (str): The path of the deployment archive.
+
+    Raises:
+        FileNotFoundError: If the archive doesn't exist, before any output folder is created for it.
+    """
+
+    # The members that are kept in memory when they are passed while scanning a tar archive, as the converter
+    # asks for them after `drpai_model.h`. The other members of the deployment, like the SDK, are never read.
+    KEPT_MEMBERS = (MODEL_METADATA_FILE, MODEL_VARIABLES_FILE)
+
+    def __init__(self, archive_path: str):
+        import zipfile
+        if not os.path.isfile(archive_path):
+            raise FileNotFoundError(f"The deployment archive is not found: {archive_path}")
+        self.archive_path = archive_path
+        self.is_zip = zipfile.is_zipfile(archive_path)
+        self.kept_members = dict()      # The contents of the `KEPT_MEMBERS` passed while scanning a tar archive
+        self.member_sizes = dict()      # The uncompressed size of each opened member
+        self.archive_hash = None        # The hash of the whole archive, calculated once if needed
+        self.__tar = None               # The tar stream of the last opened member
+
+    @staticmethod
+    def __match(member_name: str, name: str) -> bool:
+        return member_name == name or member_name.endswith("/" + name)
+
+    def open(self, name: str) -> BinaryIO:
+        """
+        Opens a member of the archive as a binary stream.
+
+        A zip archive has random access to its members. A tar archive is scanned sequentially from the
+        beginning until the member is found, and the `KEPT_MEMBERS` on the way (including the member itself)
+        are kept in memory to avoid scanning it again for them.
+
+        Args:
+            name (str): The path of the member relative to the deployment root.
+
+        Returns:
+            BinaryIO: The readable stream of the member.
+
+        Raises:
+            FileNotFoundError: If the member is not in the archive.
+        """
+        import zipfile
+        import tarfile
+        if self.is_zip:
+            with zipfile.ZipFile(self.archive_path) as archive:
+                for info in archive.infolist():
+                    if self.__match(info.filename, name):
+                        self.member_sizes[name] = info.file_size
+                        return archive.open(info)   # The file stays open until the member stream is closed
+        else:
+            for member_name, content in self.kept_members.items():
+                if self.__match(member_name, name):
+                    self.member_sizes[name] = len(content)
+                    return io.BytesIO(content)
+            self.close()
+            self.__tar = tarfile.open(self.archive_path, "r|*")
+            for member in self.__tar:
+                if not member.isfile():
+                    continue
+                if any(self.__match(member.name, kept) for kept in self.KEPT_MEMBERS):
+                    self.kept_members[member.name] = self.__tar.extractfile(member).read()
+                    if self.__match(member.name, name):
+                        self.member_sizes[name] = member.size
+                        return io.BytesIO(self.kept_members[member.name])
+                elif self.__match(member.name, name):
+                    self.member_sizes[name] = member.size
+                    return self.__tar.extractfile(member)
+        raise FileNotFoundError(f"{name} is not found in {self.archive_path}")
+
+    def fingerprint(self, name: str) -> str:
+        """
+        Returns a string that changes when the content of a member changes, to be used by `BuildCache`.
+
+        It is the CRC-32 and size from the directory of a zip archive, so nothing is decompressed.
+        A tar archive has no such directory, so the hash of the whole archive is used for all members.
+
+        Args:
+            name (str): The path of the member relative to the deployment root.
+
+        Returns:
+            str: The fingerprint of the member.
+        """
+        import zipfile
+        if self.is_zip:
+            with zipfile.ZipFile(self.archive_path) as archive:
+                for info in archive.infolist():
+                    if self.__match(info.filename, name):
+                        return f"crc32:{info.CRC:08x}:{info.file_size}"
+            raise FileNotFoundError(f"{name} is not found in {self.archive_path}")
+        if self.archive_hash is None:
+            self.archive_hash = sha256_file(self.archive_path)
+        return f"sha256:{self.archive_hash}:{name}"
+
+    def close(self):
+        """
+        Closes the tar stream of the last opened member.
+        """
+        if self.__tar is not None:
+            self.__tar.close()
+            self.__tar = None
+
+
+class BuildCache:
+    """
+    Keeps the content hashes of the inputs and outputs of each conversion stage in a JSON manifest file,
+    so the stages whose inputs have not changed can be skipped on the next run.
+
+    Each stage record looks like:
+        {"inputs": {INPUT_PATH: SHA256}, "outputs": {OUTPUT_NAME: SHA256}, "stats": {OUTPUT_NAME: [SIZE, MTIME]},
+         "variables": {KEY: VALUE}}
+    where `variables` are the `var_list` items that the stage has added, to be restored when it is skipped.
+    An output whose size and modification time (in nanoseconds) still match its `stats` is not hashed again.
+
+    Parameters:
+        manifest_path (str): The path of the manifest file.
+        output_directory (str): The directory that the output names are relative to.
+    """
+
+    def __init__(self, manifest_path: str, output_directory: str):
+        self.manifest_path = manifest_path
+        self.output_directory = output_directory
+        self.stages = dict()
+        if os.path.exists(manifest_path):
+            try:
+                with open(manifest_path, "rt") as f:
+                    manifest = json.load(f)
+                if manifest.get("version") == CACHE_VERSION:
+                    self.stages = manifest["stages"]
+            except (ValueError, KeyError):
+                logging.warning(f"Ignoring the corrupt cache manifest: {manifest_path}")
+
+    def get(self, stage: str, inputs: dict) -> Optional[dict]:
+        """
+        Looks up a stage in the cache.
+
+        Args:
+            stage (str): The name of the stage.
+            inputs (dict[str, str]): The current hashes of the stage inputs.
+
+        Returns:
+            dict | None: The stage record if the inputs are unchanged and all the outputs exist untouched,
+                otherwise None.
+        """
+        record = self.stages.get(stage)
+        if record is None or record["inputs"] != inputs:
+            return None
+        for name, digest in record["outputs"].items():
+            try:
+                stat = os.stat(f"{self.output_directory}/{name}")
+            except FileNotFoundError:
+                return None     # The output is missing
+            size, mtime = record["stats"][name]
+            if stat.st_size != size:
+                return None     # The output is tampered
+            if stat.st_mtime_ns != mtime and sha256_file(f"{self.output_directory}/{name}") != digest:
+                return None     # The output has been touched since it was recorded, and its content differs
+        return record
+
+    def put(self, stage: str, inputs: dict, outputs: dict, variables: dict):
+        """
+        Records a stage in the cache and saves the manifest file.
+
+        Args:
+            stage (str): The name of the stage.
+            inputs (dict[str, str]): The hashes of the stage inputs.
+            outputs (dict[str, str]): The hashes of the files that the stage has written, by their names.
+            variables (dict): The `var_list` items that the stage has added.
+        """
+        stats = dict()
+        for name in outputs:
+            stat = os.stat(f"{self.output_directory}/{name}")
+            stats[name] = [stat.st_size, stat.st_mtime_ns]
+        self.stages[stage] = {
+            "inputs": inputs,
+            "outputs": outputs,
+            "stats": stats,
+            "variables": variables
+        }
+        with open(self.manifest_path, "wt") as f:
+            json.dump({"version": CACHE_VERSION, "stages": self.stages}, f, indent=2)
 
 
 class EdgeImpulse2GstDRPAI:
@@ -86,21 +834,330 @@ class EdgeImpulse2GstDRPAI:
         model_name (str): The name of the model to save.
     """
 
-    def __init__(self, model_name: str, working_directory: str = '.'):
+    def __init__(self, model_name: str, working_directory: str = '.', jobs: int = 1, force: bool = False,
+                 source: Optional[str] = None, profile: bool = False, trace_memory: bool = False,
+                 bundle: bool = False, compression: Optional[str] = None, in_memory: bool = False,
+                 write_files: bool = True):
         """
         Initialises the class and recreates a directory with the name `model_name`
 
         Args:
             model_name (str): The name of the model to save.
             working_directory (str): The directory path that contains 'tflite-model' and 'model-parameters' directories.
+            jobs (int): The number of processes to convert the C arrays of `drpai_model.h` in parallel.
+            force (bool): Regenerate all the files even if the cache says they are up-to-date.
+            source (str): The path of a `.zip` or `.tar.gz` deployment archive to read the input files from,
+                instead of the `working_directory`. The model folder is still created in the `working_directory`.
+            profile (bool): Profile the stages with cProfile. The statistics are kept in `profiler`.
+            trace_memory (bool): Trace the Python memory allocations with tracemalloc, to add the peak
+                allocated memory of each stage to the `report`.
+            bundle (bool): Also pack the model folder into a single `model.bundle` file next to it.
+            compression (str): The codec of `COMPRESSION_CODECS` to compress the files of `drpai_model.h` that are
+                loaded into the memory regions (`ADDRMAP_FILES`) with, while they are decoded. The compressed files
+                have a suffix of `COMPRESSION_EXTENSIONS`.
+            in_memory (bool): Also keep the generated files in the `artifacts` dictionary. All the stages run,
+                as the skipped ones would have nothing to keep.
+            write_files (bool): Write the model folder. Without it, the outputs are only kept in `artifacts`,
+                and nothing is written on the disk.
         """
+        assert in_memory or write_files, "The outputs must be either kept in memory or written in files."
+        assert write_files or not bundle, "The bundle is packed from the files of the model folder."
         self.var_list = dict()  # Dictionary to hold keys and values read from header files
+        self.struct_members = {k: list(v) for k, v in SDK_STRUCTS.items()}   # The member names of each struct type
         self.model_name = model_name
         self.working_directory = working_directory
+        self.archive = DeploymentArchive(source) if source is not None else None
+        self.jobs = jobs
+        self.force = force
+        self.bundle = bundle
+        self.compression = compression
         self.model_path = f"{working_directory}/{model_name}"
         self.model_classification = None    # This variable is filled after running gen_postprocess_params_txt()
-        logging.info(f"Creating folder: {self.model_path}")
-        os.makedirs(self.model_path, exist_ok=True)
+        self.output_files = list()          # The paths of the files written by the running stage
+        self.bytes_read = 0                 # The number of input bytes read by the running stage
+        self.input_hashes = dict()          # The hashes of the input files, calculated once per instance
+        self.output_hashes = dict()         # The (size, SHA-256) of each output file name, calculated while writing
+        self.report = list()                # The measurements of each stage that has run, see `__measure()`
+        self.profiler = None                # The cProfile profiler of all stages, if `profile` is set
+        self.write_files = write_files
+        self.artifacts = dict() if in_memory else None  # The contents of each output file name, if `in_memory`
+        if profile:
+            import cProfile
+            self.profiler = cProfile.Profile()
+        if trace_memory:
+            import tracemalloc
+            tracemalloc.start()
+        self.cache = None
+        if write_files:
+            logging.info(f"Creating folder: {self.model_path}")
+            os.makedirs(self.model_path, exist_ok=True)
+            self.cache = BuildCache(f"{self.model_path}/.ei2gst_cache.json", self.model_path)
+
+    def __input_path(self, name: str) -> str:
+        """
+        Returns the displayable path of an input file.
+
+        Args:
+            name (str): The path of the input file relative to the deployment root, e.g. `DRPAI_MODEL_FILE`.
+
+        Returns:
+            str: The path in the `working_directory` or in the deployment archive.
+        """
+        if self.archive is not None:
+            return f"{self.archive.archive_path}:{name}"
+        return f"{self.working_directory}/{name}"
+
+    def __open_input(self, name: str) -> BinaryIO:
+        """
+        Opens an input file as a binary stream from the `working_directory` or the deployment archive.
+
+        Args:
+            name (str): The path of the input file relative to the deployment root, e.g. `DRPAI_MODEL_FILE`.
+
+        Returns:
+            BinaryIO: The readable stream of the input file.
+        """
+        if self.archive is not None:
+            f = self.archive.open(name)
+            self.__add_input(self.__input_path(name), self.archive.member_sizes[name])
+            return f
+        file_path = f"{self.working_directory}/{name}"
+        f = open(file_path, "rb")
+        self.__add_input(file_path, os.path.getsize(file_path))
+        return f
+
+    def __add_input(self, file_path: str, size: int):
+        """
+        Records a file as an input of the running stage.
+
+        Args:
+            file_path (str): The displayable path of the file that is read.
+            size (int): The size of the file in bytes.
+        """
+        logging.info("Reading file: " + file_path)
+        self.bytes_read += size
+
+    def __open_output(self, file_path: str, mode: str = "wt"):
+        """
+        Opens an output file for writing and records it as an output of the running stage.
+
+        Args:
+            file_path (str): The path of the file to write.
+            mode (str): The mode to open the file.
+
+        Returns:
+            IO: The opened file, which calculates the hash of the data as it is written.
+        """
+        self.__add_output(file_path)
+        writer = HashingWriter(file_path, self.__add_output_hash, self.__output_buffer(file_path), self.write_files)
+        return io.TextIOWrapper(io.BufferedWriter(writer)) if "t" in mode else writer
+
+    def __output_buffer(self, file_path: str) -> Optional[bytearray]:
+        """
+        Creates the buffer of an output file in `artifacts`, if the outputs are kept in memory.
+
+        Args:
+            file_path (str): The path of the file to write.
+
+        Returns:
+            bytearray | None: The empty buffer to write the contents of the file in, or None.
+        """
+        if self.artifacts is None:
+            return None
+        buffer = bytearray()
+        self.artifacts[os.path.basename(file_path)] = buffer
+        return buffer
+
+    def __read_output(self, file_path: str) -> Union[bytes, memoryview]:
+        """
+        Reads a file that an earlier stage has generated, from `artifacts` if the outputs are kept in memory,
+        or else from the model folder. The files read back are never compressed, see `__output_variant()`.
+
+        Args:
+            file_path (str): The path of the file.
+
+        Returns:
+            bytes | memoryview: The contents.
+        """
+        if self.artifacts is not None:
+            data = self.artifacts[os.path.basename(file_path)]
+            self.__add_input(file_path, len(data))
+            return data
+        self.__add_input(file_path, os.path.getsize(file_path))
+        with open(file_path, "rb") as f:
+            return f.read()
+
+    def __add_output(self, file_path: str):
+        """
+        Records a file as an output of the running stage.
+
+        Args:
+            file_path (str): The path of the file that is written.
+        """
+        logging.info("  Writing file: " + file_path)
+        self.output_files.append(file_path)
+
+    def __add_output_hash(self, file_path: str, size: int, digest: str):
+        """
+        Records the size and SHA-256 of an output file that are calculated while it was written.
+
+        Args:
+            file_path (str): The path of the file.
+            size (int): The size of the file in bytes.
+            digest (str): The hex digest of the SHA-256 of the file.
+        """
+        name = os.path.basename(file_path)
+        self.output_hashes[name] = (size, digest)
+        if self.artifacts is not None and isinstance(self.artifacts.get(name), bytearray):
+            # The file is complete, so it is shared as a read-only view instead of a copy.
+            self.artifacts[name] = memoryview(self.artifacts[name]).toreadonly()
+
+    @contextlib.contextmanager
+    def __measure(self, stage_name: str):
+        """
+        Measures the resources used by a stage and appends them to the `report` list as a dictionary with:
+        - `stage`: The name of the stage.
+        - `cached`: Whether the stage was skipped because its outputs were up-to-date.
+        - `wall_time`: The elapsed time in seconds.
+        - `cpu_time`: The user and system CPU time in seconds, including the finished child processes.
+        - `peak_rss_delta`: The growth of the peak resident memory of the process in KB.
+        - `bytes_read`, `bytes_written`: The sizes of the input and output files of the stage.
+        - `read_throughput`, `write_throughput`: The bytes read and written per wall time in MB/s.
+        - `traced_memory_peak`: The peak memory allocated by Python in KB, if tracemalloc is tracing.
+
+        Args:
+            stage_name (str): The name of the stage.
+
+        Yields:
+            dict: The measurements of the stage, where `cached` can be set while the stage runs.
+        """
+        import tracemalloc
+        measurements = {"stage": stage_name, "cached": False}
+        self.output_files = list()
+        self.bytes_read = 0
+        if tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+        start_cpu_time, start_peak_rss = resource_usage()
+        start_time = time.perf_counter()
+        if self.profiler is not None:
+            self.profiler.enable()
+        try:
+            yield measurements
+        finally:
+            if self.profiler is not None:
+                self.profiler.disable()
+            wall_time = time.perf_counter() - start_time
+            end_cpu_time, end_peak_rss = resource_usage()
+            bytes_written = sum(os.path.getsize(f) for f in self.output_files if os.path.isfile(f))
+            measurements.update({
+                "wall_time": wall_time,
+                "cpu_time": end_cpu_time - start_cpu_time,
+                "peak_rss_delta": end_peak_rss - start_peak_rss,
+                "bytes_read": self.bytes_read,
+                "bytes_written": bytes_written,
+                "read_throughput": self.bytes_read / 1e6 / wall_time if wall_time > 0 else 0,
+                "write_throughput": bytes_written / 1e6 / wall_time if wall_time > 0 else 0,
+            })
+            if tracemalloc.is_tracing():
+                measurements["traced_memory_peak"] = tracemalloc.get_traced_memory()[1] // 1024
+            self.report.append(measurements)
+
+    def write_report(self, file_path: str):
+        """
+        Writes the measurements of the stages that have run and their totals in a JSON file.
+
+        Args:
+            file_path (str): The path of the JSON file to write.
+        """
+        total = {key: sum(m[key] for m in self.report)
+                 for key in ("wall_time", "cpu_time", "peak_rss_delta", "bytes_read", "bytes_written")}
+        with open(file_path, "wt") as f:
+            json.dump({"model_name": self.model_name, "stages": self.report, "total": total}, f, indent=2)
+
+    def __run_stage(self, stage, *inputs: str, settings: Optional[dict] = None):
+        """
+        Runs a stage of the pipeline unless its inputs and outputs are unchanged since the last run.
+        When it is skipped, the variables it has added to `var_list` are restored from the cache.
+        Either way, the resources it uses are measured in the `report`.
+
+        Args:
+            stage (Callable): The bound method of the stage, e.g. `self.gen_labels_txt`.
+            *inputs (str): The input file paths that the stage depends on, relative to `working_directory`.
+            settings (dict): The options that change the outputs of the stage, so it runs again when they change.
+        """
+        with self.__measure(stage.__name__) as measurements:
+            self.__run_cached_stage(stage, inputs, measurements, settings)
+
+    def __input_hash(self, name: str) -> str:
+        """
+        Returns the content hash of an input file, calculated once per instance.
+
+        Args:
+            name (str): The path of the input file relative to the deployment root, e.g. `DRPAI_MODEL_FILE`.
+
+        Returns:
+            str: The SHA-256 of the file, or its fingerprint in the deployment archive.
+        """
+        if name not in self.input_hashes:
+            if self.archive is not None:
+                self.input_hashes[name] = self.archive.fingerprint(name)
+            else:
+                self.input_hashes[name] = sha256_file(f"{self.working_directory}/{name}")
+        return self.input_hashes[name]
+
+    def __run_cached_stage(self, stage, inputs: Tuple[str, ...], measurements: dict, settings: Optional[dict]):
+        """
+        Runs a stage of the pipeline unless the cache says it is up-to-date. See `__run_stage()`.
+
+        Args:
+            stage (Callable): The bound method of the stage, e.g. `self.gen_labels_txt`.
+            inputs (tuple[str]): The input file paths that the stage depends on, relative to `working_directory`.
+            measurements (dict): The measurements of the stage, to set whether it was `cached`.
+            settings (dict): The options that change the outputs of the stage, if any.
+        """
+        input_hashes = {input_path: self.__input_hash(input_path) for input_path in inputs}
+        if settings:
+            input_hashes["settings"] = settings
+        record = None if self.force or self.artifacts is not None else self.cache.get(stage.__name__, input_hashes)
+        if record is not None:
+            logging.info(f"Skipping {stage.__name__}: the outputs are up-to-date.")
+            self.var_list.update(record["variables"])
+            for name, digest in record["outputs"].items():
+                # The cache has just checked these files, so their hashes can be reused for the manifest.
+                self.output_hashes[name] = (os.path.getsize(f"{self.model_path}/{name}"), digest)
+            measurements["cached"] = True
+            return
+
+        previous_var_list = dict(self.var_list)
+        stage()
+        variables = {k: v for k, v in self.var_list.items() if k not in previous_var_list}
+        outputs = dict()
+        for file_path in self.output_files:
+            name = os.path.basename(file_path)
+            outputs[name] = self.output_hashes[name][1] if name in self.output_hashes else sha256_file(file_path)
+        if self.cache is not None:
+            self.cache.put(stage.__name__, input_hashes, outputs, variables)
+
+    def __output_variant(self, file_path: str) -> str:
+        """
+        Returns the path to write a file of `drpai_model.h` with the suffix of the `compression` codec,
+        and removes the variants of the file that an earlier run has written with another codec or none.
+
+        Only the files of `ADDRMAP_FILES` are compressed. The address map and the `.part2` file are read by the
+        plugin and by the later stages as they are, so they never get a suffix.
+
+        Args:
+            file_path (str): The path of the uncompressed file.
+
+        Returns:
+            str: The path to write. Its codec is given by `artifact_codec()`.
+        """
+        compressible = os.path.basename(file_path) in {name.format(self.model_name) for name in ADDRMAP_FILES.values()}
+        output_file_path = file_path + COMPRESSION_EXTENSIONS.get(self.compression, "") if compressible else file_path
+        for extension in [""] + list(COMPRESSION_EXTENSIONS.values()):
+            if self.write_files and file_path + extension != output_file_path and os.path.isfile(file_path + extension):
+                os.remove(file_path + extension)
+        return output_file_path
 
     def __arrayname_2_filename(self, array_name: str) -> str:
         """
@@ -131,8 +1188,11 @@ class EdgeImpulse2GstDRPAI:
         Extracts DRPAI model files by reading C arrays in the header file `tflite-model/drpai_model.h`
         and writing them down into binary files.
 
-        It identifies array declarations and converts their data into bytearrays,
-        which are then written to separate files. It also extracts and stores some metadata key-value pairs.
+        It first indexes the byte range of each array declaration in the memory-mapped file, then converts
+        their data into bytearrays in chunks of `HEX_CHUNK_SIZE`, which are streamed into separate files.
+        So the memory usage stays flat regardless of the array sizes. The arrays are converted in parallel
+        by `jobs` processes. When reading from a deployment archive, the member is streamed and converted
+        in a single sequential pass instead. It also extracts and stores some metadata key-value pairs.
 
         Raises:
             AssertionError: If the file size does not match the array length.
@@ -149,160 +1209,241 @@ class EdgeImpulse2GstDRPAI:
               Writing file: model/model.part2
         """
 
-        file_path = f"{self.working_directory}/tflite-model/drpai_model.h"
-        logging.info("Reading file: " + file_path)
+        if self.archive is not None:
+            with self.__open_input(DRPAI_MODEL_FILE) as f:
+                self.__extract_drpai_model_stream(f)
+            return
+
+        file_path = f"{self.working_directory}/{DRPAI_MODEL_FILE}"
+        self.__add_input(file_path, os.path.getsize(file_path))
+        arrays = self.__index_drpai_model_file(file_path)
+
+        # Each C array is independent, so they can be converted in parallel.
+        # The sizes and hashes are collected in the same order as `arrays`.
+        # In memory, they are converted in this process instead, so the contents don't have to be sent back.
+        if self.jobs > 1 and len(arrays) > 1 and self.artifacts is None:
+            from concurrent.futures import ProcessPoolExecutor
+            workers = min(self.jobs, len(arrays))
+            # The `jobs` are shared by the processes, so each one compresses with its part of the threads.
+            threads = max(1, self.jobs // workers)
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                futures = list()
+                for output_file_path, start, end, _ in arrays:
+                    self.__add_output(output_file_path)
+                    futures.append(executor.submit(extract_hex_array, file_path, start, end, output_file_path,
+                                                   artifact_codec(output_file_path), threads))
+                results = [future.result() for future in futures]
+        else:
+            results = list()
+            for output_file_path, start, end, _ in arrays:
+                self.__add_output(output_file_path)
+                results.append(extract_hex_array(file_path, start, end, output_file_path, artifact_codec(output_file_path),
+                                                 self.jobs, self.__output_buffer(output_file_path), self.write_files))
+
+        for (output_file_path, _, _, length_key), (output_file_size, digest) in zip(arrays, results):
+            written_size = os.path.getsize(output_file_path) if self.write_files \
+                else len(self.artifacts[os.path.basename(output_file_path)])
+            self.__add_output_hash(output_file_path, written_size, digest)
+            if length_key is not None:
+                # Ensure the length of the array is correct.
+                assert output_file_size == int(self.var_list[length_key]), f"{output_file_path} seems to be corrupt."
+
+    def __index_drpai_model_file(self, file_path: str) -> List[Tuple[str, int, int, Optional[str]]]:
+        """
+        Quickly scans the memory-mapped header file to find the byte range of each C array body without
+        decoding them. The scalar variable declarations are stored in the `var_list` dictionary along the way.
+
+        Only the lines that include `=` are looked at, and the array bodies are skipped by searching for
+        their closing bracket, so the scan never walks the file line by line.
+
+        Args:
+            file_path (str): The path of `drpai_model.h`.
+
+        Returns:
+            list[(str, int, int, str)]: The output file path, start offset, end offset and the name of the
+                `_len` variable (or None if it is not declared) for each C array in the order of the file.
+        """
+        arrays = list()
+        with open(file_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            # Jump from one declaration/assignment to the next.
+            position = mm.find(b"=")
+            while position != -1:
+                line_start = mm.rfind(b"\n", 0, position) + 1
+                line_end = mm.find(b"\n", position)
+                if line_end == -1:
+                    line_end = len(mm)
+                line = mm[line_start:line_end].decode()
+                if "[]" in line:
+                    # We have a new C array declaration. Its body starts right after this line.
+                    # Generate the `output_file_path` from its name and find the closing bracket.
+                    # The search goes through windows of `HEX_CHUNK_SIZE` to keep the resident memory low.
+                    output_file_path = self.__output_variant(self.__arrayname_2_filename(line))
+                    end = -1
+                    window = line_end
+                    while end == -1 and window < len(mm):
+                        end = mm.find(b"}", window, window + HEX_CHUNK_SIZE)
+                        release_mapped_pages(mm, window, min(window + HEX_CHUNK_SIZE, len(mm)))
+                        window += HEX_CHUNK_SIZE
+                    if end == -1:
+                        end = len(mm)
+                    arrays.append((output_file_path, line_end + 1, end, None))
+                    line_end = end
+                else:
+                    # We have a scalar variable declaration.
+                    key = self.__read_scalar_declaration(line)
+                    if key.endswith("_len") and len(arrays) > 0:
+                        # It is the length of the last array, let's remember it for verification.
+                        arrays[-1] = arrays[-1][:3] + (key,)
+                position = mm.find(b"=", line_end)
+        return arrays
+
+    def __read_scalar_declaration(self, line: str) -> str:
+        """
+        Stores a scalar variable declaration of `drpai_model.h` like `unsigned int NAME = VALUE;`
+        in the `var_list` dictionary.
+
+        Args:
+            line (str): The declaration line.
+
+        Returns:
+            str: The name of the variable.
+        """
+        line_sections = line.split(" ")
+        key = line_sections[-3]
+        value = line_sections[-1].replace("\r", "").replace("\n", "").replace(";", "")
+        self.var_list[key] = c_literal(value)
+        return key
+
+    def __extract_drpai_model_stream(self, reader: BinaryIO):
+        """
+        Extracts DRPAI model files from a sequential stream of `drpai_model.h`, such as an archive member,
+        in a single pass. Blocks of `HEX_CHUNK_SIZE` are read and each C array body is decoded and written
+        as soon as its values arrive.
+
+        Args:
+            reader (BinaryIO): The readable stream of `drpai_model.h`.
+
+        Raises:
+            AssertionError: If the file size does not match the array length.
+        """
         output_file_size = 0        # the size of the last output file
         output_file_path = None     # the path of the last output file
-        with open(file_path, "rt") as f:
-            # Read the C header file line by line.
-            for line in f:
-                # Are we currently in the middle of writing a binary file?
-                if output_file_path is None:
-                    if "=" in line:
-                        # This line is a declaration/assignment.
-                        if "[]" in line:
-                            # We have a new C array declaration.
-                            # Generate the `output_file_path` from its name.
-                            output_file_path = self.__arrayname_2_filename(line)
-                            self.var_list[output_file_path] = bytearray()
-                            logging.info("  Writing file: " + output_file_path)
-                        else:
-                            # We have a scalar variable declaration.
-                            # Store it in the `var_list` dictionary.
-                            line_sections = line.split(" ")
-                            key = line_sections[-3]
-                            value = line_sections[-1].replace("\n", "").replace(";", "")
-                            self.var_list[key] = value
-                            if key.endswith("_len"):
-                                # Ensure the length of the last array is correct.
-                                assert output_file_size == int(value), f"{output_file_path} seems to be corrupt."
-                else:
-                    # We are currently writing a binary file
-                    if "}" in line:
-                        # The C array declaration has ended, write it in a file and store its length.
-                        with open(output_file_path, "wb") as writer:
-                            writer.write(self.var_list[output_file_path])
-                        output_file_size = len(self.var_list[output_file_path])
-                        del self.var_list[output_file_path]
-                        output_file_path = None
-                        gc.collect()
+        writer = None               # the opened binary file of the C array being decoded
+        buffer = b""                # the bytes that are read but not processed yet
+        # A newline is appended to the end, so the last line is always complete.
+        for block in itertools.chain(iter(lambda: reader.read(HEX_CHUNK_SIZE), b""), [b"\n"]):
+            buffer += block
+            while True:
+                if writer is None:
+                    # Jump to the next declaration/assignment if its line is complete.
+                    position = buffer.find(b"=")
+                    line_end = buffer.find(b"\n", position) if position != -1 else -1
+                    if line_end == -1:
+                        # Keep the incomplete line for the next block.
+                        buffer = buffer[buffer.rfind(b"\n", 0, position if position != -1 else len(buffer)) + 1:]
+                        break
+                    line = buffer[buffer.rfind(b"\n", 0, position) + 1:line_end].decode()
+                    buffer = buffer[line_end + 1:]
+                    if "[]" in line:
+                        # We have a new C array declaration. Its body starts right after this line.
+                        output_file_path = self.__output_variant(self.__arrayname_2_filename(line))
+                        output_file_size = 0
+                        writer = self.__open_output(output_file_path, "wb")
+                        if artifact_codec(output_file_path) is not None:
+                            from artifact_compression import ChunkedCompressor
+                            writer = ChunkedCompressor(writer, artifact_codec(output_file_path), self.jobs)
                     else:
-                        # The C array has not ended yet, so convert hex values to binary and append.
-                        self.var_list[output_file_path] += csv_2_bytearray(line.replace("\n", ""))
+                        # We have a scalar variable declaration.
+                        key = self.__read_scalar_declaration(line)
+                        if key.endswith("_len"):
+                            # Ensure the length of the last array is correct.
+                            assert output_file_size == int(self.var_list[key]), f"{output_file_path} seems to be corrupt."
+                else:
+                    # We are in the middle of a C array body, decode up to its end or the last complete value.
+                    end = buffer.find(b"}")
+                    cut = end if end != -1 else buffer.rfind(b",") + 1
+                    data = csv_2_bytearray(buffer[:cut])
+                    writer.write(data)
+                    output_file_size += len(data)
+                    buffer = buffer[cut:]
+                    if end == -1:
+                        break
+                    writer.close()
+                    writer = None
+        if writer is not None:
+            # The file has ended in the middle of a C array body.
+            writer.write(csv_2_bytearray(buffer))
+            writer.close()
+
+    @staticmethod
+    def __variable_table_hash(table: dict) -> str:
+        """
+        Calculates the SHA-256 of the parsed structs and variables of a variable table.
+
+        Args:
+            table (dict): The variable table.
+
+        Returns:
+            str: The hexadecimal SHA-256 of the canonical JSON of its `structs` and `variables`.
+        """
+        content = json.dumps({"structs": table.get("structs"), "variables": table.get("variables")}, sort_keys=True)
+        return hashlib.sha256(content.encode()).hexdigest()
 
     def read_variables(self):
         """
         Reads and stores variables the `model_metadata.h` and `model_variables.h` header files.
-        It also handles various formats and structures within the header files.
+        The headers are parsed by `CHeaderParser` into a typed table of the variables and the struct members,
+        which is kept in `model/.ei2gst_variables.json` next to the build cache, so it is not deployed.
+        The next runs load that table instead of parsing the headers again, as long as the hashes of the headers
+        are unchanged and the table still matches its own hash.
 
         This function must be called after `gen_drpai_model_files()`.
         """
-
-        file_path = f"{self.working_directory}/model-parameters/model_metadata.h"
-        logging.info("Reading file: " + file_path)
-        struct_variables = None     # A list of variable names when they are grouped in a structure
-        with open(file_path, "rt") as f:
-            # Read the C header file line by line.
-            for line in f:
-                # By splitting the line into words, we can look for C language keywords
-                line_sections = line.split()
-                if len(line_sections) == 0:
-                    continue    # Empty line, skip
-
-                # Are we in the middle of a struct definition?
-                if struct_variables is None:
-                    if line_sections[0] == "#define":
-                        if len(line_sections) == 3:
-                            # It is a define macro, so it should follow the grammar `#define KEY VALUE`
-                            # Let's add it to the dictionary of variables
-                            self.var_list[line_sections[1]] = line_sections[2]
-                    elif line_sections == ["typedef", "struct", "{"]:
-                        # It is starting a struct definition, let's group all those variables in a list.
-                        struct_variables = list()
-
-                else:
-                    # It is a member of a struct definition.
-                    if len(line_sections) >= 2:
-                        # The line probably looks like `type name;`, `type * name;`, `type *name;` or `} name;`
-                        # We only care about the last word which is a name.
-                        name = line_sections[-1].replace("*", "").replace(";", "")
-                        if line_sections[0] == "}":
-                            # The struct definition is finished
-                            # Let's add all the variable names to the dictionary with a prefix of the struct name.
-                            # Note: there are no values in the definition; we will write their values later.
-                            for var_member in struct_variables:
-                                self.var_list[f"{name}_{var_member}"] = None
-                            struct_variables = None
-                        else:
-                            # The struct definition is not finished yet; let's just hold the variable name
-                            struct_variables.append(name)
-
-        file_path = f"{self.working_directory}/model-parameters/model_variables.h"
-        logging.info("Reading file: " + file_path)
-        struct_variables = list()   # A list of variable names when they are grouped in a structure
-        with open(file_path, "rt") as f:
-            # Read the C header file line by line.
-            for line in f:
-                # By splitting the line into words, we can look for C language keywords
-                line_sections = line.split()
-                if len(line_sections) == 0:
-                    continue    # Empty line, skip
-
-                # Are we in the middle of a struct initialization?
-                if len(struct_variables) == 0:
-                    # We haven't started a struct initialization.
-                    if "=" in line:
-                        # We have a new assignment
-                        if "[]" in line:
-                            # It is defining an array
-                            # Let's extract its contents into a list and save it in the `var_list`
-                            name = line_sections[line_sections.index("=")-1].replace("[]", "")
-                            value = line[line.find("{")+1: line.find("}")]
-                            value = value.replace("\"", "").replace(" ", "")
-                            self.var_list[name] = value.split(",")
-                        elif "ei_object_detection_nms_config_t" in line:
-                            # This structure is defined in `edge-impulse-sdk` but we don't need to read it all
-                            # I just steal the definition of and put it in the struct_variables.
-                            struct_variables = [
-                                "ei_object_detection_nms_config_t_confidence_threshold",
-                                "ei_object_detection_nms_config_t_iou_threshold"
-                            ]
-                        elif "{" in line:
-                            # It is starting a struct initialization. The line should look like `const TYPE NAME = {`
-                            # We need the name of all variables inside the structure to assign values to them.
-                            # So let's grab all the variable names that have the prefix of `TYPE_`
-                            if line_sections[0] == "const":
-                                # Delete the const keyword
-                                del line_sections[0]
-                            struct_variables = [k for k in self.var_list.keys() if k.startswith(line_sections[0])]
-                        else:
-                            # It is defining a variable. The line should look like `const TYPE NAME = VALUE;`
-                            # Let's write it into the `var_list`
-                            if line_sections[0] == "const":
-                                # Delete the const keyword
-                                del line_sections[0]
-                            self.var_list[line_sections[1]] = line_sections[-1].replace(";", "")
-                else:
-                    # We are in the middle of a struct initialization.
-                    # The order of values match the order of variable names at the declaration time.
-                    # Variable names are already selected in `struct_variables`.
-                    # Let's assign values to the first item and remove. It will eventually become empty.
-                    value = line_sections[0].replace(",", "").replace("\"", "").replace("\"", "")
-                    self.var_list[struct_variables[0]] = value
-                    del struct_variables[0]
+        file_path = f"{self.model_path}/.ei2gst_variables.json"
+        inputs = {name: self.__input_hash(name) for name in (MODEL_METADATA_FILE, MODEL_VARIABLES_FILE)}
+        table = None
+        if not self.force and self.write_files and os.path.isfile(file_path):
+            with open(file_path, "rt") as f:
+                try:
+                    table = json.load(f)
+                except ValueError:
+                    logging.warning(f"Ignoring the corrupt variable table: {file_path}")
+            if table is not None and (table.get("version") != VARIABLE_TABLE_VERSION or table.get("inputs") != inputs):
+                table = None    # The headers have changed since the table was saved
+            elif table is not None and table.get("sha256") != self.__variable_table_hash(table):
+                logging.warning(f"Ignoring the modified variable table: {file_path}")
+                table = None
+        if table is not None:
+            self.__add_input(file_path, os.path.getsize(file_path))
+        else:
+            # Parse both headers with the same struct index, as `model_variables.h` initializes
+            # the structs that are defined in `model_metadata.h`.
+            parser = CHeaderParser(self.struct_members)
+            for name in (MODEL_METADATA_FILE, MODEL_VARIABLES_FILE):
+                with self.__open_input(name) as f:
+                    parser.parse(f.read().decode())
+            table = {"version": VARIABLE_TABLE_VERSION, "inputs": inputs,
+                     "structs": parser.structs, "variables": parser.variables}
+            table["sha256"] = self.__variable_table_hash(table)
+            if self.write_files:
+                with open(file_path, "wt") as f:
+                    json.dump(table, f, indent=2)
+                # Older versions saved the table in the model folder, which deployed it.
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(f"{self.model_path}/{self.model_name}_variables.json")
+        self.struct_members.update(table["structs"])
+        self.var_list.update(table["variables"])
 
         # We also need to store the address and sizes of each model file in `var_list` dictionary.
         # They are included in `model/model_addrmap_intm.txt` in a format of `NAME HEX_ADDRESS HEX_SIZE` lines.
-        file_path = f"{self.model_path}/{self.model_name}_addrmap_intm.txt"
-        logging.info("Reading file: " + file_path)
-        with open(file_path, "rt") as f:
-            # Read the text file line by line.
-            for line in f:
-                line_sections = line.split()
-                if len(line_sections) == 3:
-                    # Store the address and size separately.
-                    self.var_list[f"{line_sections[0]}_address"] = line_sections[1]
-                    self.var_list[f"{line_sections[0]}_size"] = line_sections[2]
+        addrmap = self.__read_output(f"{self.model_path}/{self.model_name}_addrmap_intm.txt")
+        # Read the text file line by line.
+        for line in bytes(addrmap).decode().splitlines():
+            line_sections = line.split()
+            if len(line_sections) == 3:
+                # Store the address and size separately.
+                self.var_list[f"{line_sections[0]}_address"] = line_sections[1]
+                self.var_list[f"{line_sections[0]}_size"] = line_sections[2]
 
     def gen_data_in_list_txt(self):
         """
@@ -318,16 +1459,16 @@ class EdgeImpulse2GstDRPAI:
         file_path = f"{self.model_path}/{self.model_name}_data_in_list.txt"
 
         # Retrieve required variables from var_list dictionary
-        channels = self.var_list['ei_dsp_config_image_t_channels'].lower()
+        channels = self.var_list.get('ei_dsp_config_image_t_channels')
         address = self.var_list['data_in_address']
-        width = self.var_list['EI_CLASSIFIER_INPUT_WIDTH']
-        height = self.var_list['EI_CLASSIFIER_INPUT_HEIGHT']
+        width = self.var_list.get('EI_CLASSIFIER_INPUT_WIDTH')
+        height = self.var_list.get('EI_CLASSIFIER_INPUT_HEIGHT')
         # Ensure all necessary variables are present
         assert channels is not None and width is not None and height is not None, \
             "The loaded model_variables.h doesn't have required input items."
+        channels = channels.lower()
 
-        logging.info("  Writing file: " + file_path)
-        with open(file_path, "wt") as f:
+        with self.__open_output(file_path) as f:
             f.write(f"Input_node_name: {channels}_data\n"
                     f"         Address: 0x{address}\n"
                     f"         Channel: {len(channels)}\n"
@@ -351,8 +1492,7 @@ class EdgeImpulse2GstDRPAI:
         # Ensure the number of labels matches the expected label count
         assert len(labels) == int(self.var_list['EI_CLASSIFIER_LABEL_COUNT']), "The loaded labels seems to be corrupt."
 
-        logging.info("  Writing file: " + file_path)
-        with open(file_path, "wt") as f:
+        with self.__open_output(file_path) as f:
             f.write("\n".join(labels))  # Write the labels, each on a new line
 
     def gen_data_out_list_txt(self):
@@ -372,8 +1512,7 @@ class EdgeImpulse2GstDRPAI:
         # Ensure there are output grids available
         assert len(grid_sizes) > 0, "The loaded drpai_model.h doesn't have the required output grids."
 
-        logging.info("  Writing file: " + file_path)
-        with open(file_path, "wt") as f:
+        with self.__open_output(file_path) as f:
             for grid_size_param in grid_sizes:
                 grid_size = self.var_list[grid_size_param]
                 f.write(f"Output_node_name: {grid_size_param}\n"
@@ -409,8 +1548,8 @@ class EdgeImpulse2GstDRPAI:
             model_version = "5"
 
             # Retrieve and validate the IoU threshold from var_list dictionary
-            iou_threshold = self.var_list["ei_object_detection_nms_config_t_iou_threshold"][:-1]
-            assert float(iou_threshold) >= 0, \
+            iou_threshold = self.var_list.get("ei_object_detection_nms_config_t_iou_threshold")
+            assert isinstance(iou_threshold, (int, float)) and iou_threshold >= 0, \
                 "The loaded model_variables.h doesn't have the required output iou_threshold."
 
         elif "fomo" in self.model_classification.lower():
@@ -422,8 +1561,7 @@ class EdgeImpulse2GstDRPAI:
         assert model_version is not None, f"The script doesn't support classification version '{self.model_classification}'."
 
 
-        logging.info("  Writing file: " + file_path)
-        with open(file_path, "wt") as f:
+        with self.__open_output(file_path) as f:
             f.write(f"[dynamic_library]\n{post_process_library}\n\n"
                     f"[yolo_version]\n{model_version}\n\n"
                     f"[iou_threshold]\n{iou_threshold}")
@@ -432,38 +1570,76 @@ class EdgeImpulse2GstDRPAI:
         """
         Generates a `model_anchors.txt` file with anchor values.
 
-        This method reads the YOLOv5 model, extracts anchor values for different grid sizes,
-        and writes them to a text file.
+        This method reads the constant tensors of the YOLOv5 model straight from its flatbuffer,
+        extracts anchor values for different grid sizes, and writes them to a text file.
         """
-        model_path = f"{self.model_name}/yolov5.part2"
-
-        logging.info("Reading file: " + model_path)
-
-        # Initialize the TensorFlow Lite interpreter for the YOLOv5 model
-        interpreter = tflite.Interpreter(model_path=model_path)
-        interpreter.allocate_tensors()
+        tensors = index_tflite_tensors(self.__read_output(f"{self.model_path}/yolov5.part2"))
 
         # Retrieve grid sizes from var_list dictionary
         grids = list()
         i = 0
         grid_var_key = f"NUM_GRID_{i+1}"
-        while ei.var_list.__contains__(grid_var_key):
-            grids.append(int(ei.var_list[grid_var_key]))
+        while self.var_list.__contains__(grid_var_key):
+            grids.append(int(self.var_list[grid_var_key]))
             i += 1
             grid_var_key = f"NUM_GRID_{i+1}"
 
         file_path = f"{self.model_path}/{self.model_name}_anchors.txt"
-        logging.info("  Writing file: " + file_path)
-
         # Find anchor values and write them to the text file
-        with open(file_path, "wt") as f:
-            while len(grids) > 0:
-                g, anchors = get_grid_anchors(interpreter, grids)
-                if anchors is not None:
-                    for a in anchors:
-                        for b in a:
-                            f.write(f"{b}\n")
-                    grids.remove(g)
+        with self.__open_output(file_path) as f:
+            for g, anchors in get_grid_anchors(tensors, grids):
+                for a in anchors:
+                    for b in a:
+                        f.write(f"{b}\n")
+
+    def gen_manifest(self):
+        """
+        Generates a `model/model_manifest.json` file with the size, SHA-256 and DRP-AI memory address
+        (from `model_addrmap_intm.txt`) of each file in the model folder, to check a deployed folder with
+        `verify_manifest()`.
+
+        The hashes are the ones calculated while the files were written, or verified by the cache when their
+        stage was skipped. So the files are only read again if neither has happened in this run.
+
+        This function must be called after all the other files of the model folder are generated.
+        """
+        file_path = f"{self.model_path}/{self.model_name}_manifest.json"
+        addresses = {file_name.format(self.model_name): f"0x{self.var_list[f'{region}_address']}"
+                     for region, file_name in ADDRMAP_FILES.items() if f"{region}_address" in self.var_list}
+        files = dict()
+        if self.artifacts is not None:
+            names = list(self.artifacts)
+        else:
+            names = [name for name in os.listdir(self.model_path) if os.path.isfile(f"{self.model_path}/{name}")]
+        for name in sorted(names):
+            output_file_path = f"{self.model_path}/{name}"
+            if name.startswith(".") or output_file_path == file_path:
+                continue
+            if name not in self.output_hashes:
+                self.__add_input(output_file_path, os.path.getsize(output_file_path))
+                self.output_hashes[name] = (os.path.getsize(output_file_path), sha256_file(output_file_path))
+            size, digest = self.output_hashes[name]
+            codec = artifact_codec(name)
+            base_name = name[:-len(COMPRESSION_EXTENSIONS[codec])] if codec is not None else name
+            files[name] = {"size": size, "sha256": digest, "address": addresses.get(base_name)}
+        with self.__open_output(file_path) as f:
+            json.dump({"version": MANIFEST_VERSION, "model_name": self.model_name, "files": files}, f, indent=2)
+
+    def gen_bundle(self):
+        """
+        Packs all the files of the model folder into a `model.bundle` file next to it, by `pack_bundle()`.
+        The cache manifest is left out, as it is only useful to the converter.
+
+        This function must be called after all the other files are generated.
+        """
+        file_path = f"{self.working_directory}/{self.model_name}.bundle"
+        names = sorted(name for name in os.listdir(self.model_path)
+                       if not name.startswith(".") and os.path.isfile(f"{self.model_path}/{name}"))
+        for name in names:
+            self.__add_input(f"{self.model_path}/{name}", os.path.getsize(f"{self.model_path}/{name}"))
+        self.__add_output(file_path)
+        from model_bundle import pack_bundle
+        pack_bundle(self.model_path, names, file_path)
 
     def run(self):
         """
@@ -477,17 +1653,246 @@ class EdgeImpulse2GstDRPAI:
         5. Generate the `model_data_out_list.txt` file.
         6. Generate the `model_post_process_params.txt` file.
         7. If the model classification is YOLO, generate the `model_anchors.txt` file.
+        8. Generate the `model_manifest.json` file with the hashes of all the files.
+        9. If `bundle` is set, pack the model folder into `model.bundle`.
+
+        The resources used by each step are measured in the `report` list.
 
         This method ensures that all necessary files and parameters are generated in the correct order.
+        Each step is skipped if its input files and output files have not changed since the last run,
+        unless `force` is set.
         """
-        self.gen_drpai_model_files()
-        self.read_variables()           # Fills the `var_list` dictionary
-        self.gen_data_in_list_txt()
-        self.gen_labels_txt()
-        self.gen_data_out_list_txt()
-        self.gen_postprocess_params_txt()
+        self.__run_stage(self.gen_drpai_model_files, DRPAI_MODEL_FILE,
+                         settings={"compression": self.compression} if self.compression is not None else None)
+        with self.__measure(self.read_variables.__name__):
+            self.read_variables()       # Fills the `var_list` dictionary
+        self.__run_stage(self.gen_data_in_list_txt, DRPAI_MODEL_FILE, MODEL_METADATA_FILE, MODEL_VARIABLES_FILE)
+        self.__run_stage(self.gen_labels_txt, MODEL_METADATA_FILE, MODEL_VARIABLES_FILE)
+        self.__run_stage(self.gen_data_out_list_txt, DRPAI_MODEL_FILE)
+        self.__run_stage(self.gen_postprocess_params_txt, MODEL_METADATA_FILE, MODEL_VARIABLES_FILE)
+        if self.model_classification is None:
+            # `gen_postprocess_params_txt()` was skipped
+            self.model_classification = self.var_list["EI_CLASSIFIER_OBJECT_DETECTION_LAST_LAYER"]
         if "yolo" in self.model_classification.lower():
-            self.gen_anchors_txt()
+            self.__run_stage(self.gen_anchors_txt, DRPAI_MODEL_FILE, MODEL_METADATA_FILE)
+        if self.archive is not None:
+            self.archive.close()
+        with self.__measure(self.gen_manifest.__name__):
+            self.gen_manifest()
+        if self.bundle:
+            with self.__measure(self.gen_bundle.__name__):
+                self.gen_bundle()
+
+
+def convert_to_memory(model_name: str, working_directory: str = '.', source: Optional[str] = None,
+                      write_files: bool = False, jobs: int = 1, compression: Optional[str] = None) -> dict:
+    """
+    Converts a deployment into an in-memory map of the files of the model folder, for services that stream
+    them into their own containers or object stores instead of reading them back from the disk.
+
+    The files are collected while they are written, and each one is shared as a read-only `memoryview`
+    of its buffer, so the contents are never copied. Nothing is written on the disk unless `write_files` is set,
+    in which case the model folder is written as usual too.
+
+    Args:
+        model_name (str): The folder and prefix of files to create.
+        working_directory (str): The directory that contains 'tflite-model' and 'model-parameters' directories.
+        source (str): The path of a `.zip` or `.tar.gz` deployment archive to read instead, if any.
+        write_files (bool): Also write the model folder in the `working_directory`.
+        jobs (int): The number of threads to compress the files with.
+        compression (str): The codec to compress the files of `drpai_model.h` with, or None.
+
+    Returns:
+        dict: The `artifacts` with the contents of each file name, the `variables` and `structs` parsed from
+            the headers, and the `manifest` with the size, SHA-256 and address of each file.
+
+    Example:
+        >>> result = convert_to_memory("yolov5", source="yolov5-ei-sample.tar.gz")
+        >>> bytes(result["artifacts"]["yolov5_labels.txt"])
+        b'apple\\nbanana'
+    """
+    ei = EdgeImpulse2GstDRPAI(model_name, working_directory, jobs=jobs, source=source, compression=compression,
+                              in_memory=True, write_files=write_files)
+    ei.run()
+    manifest = json.loads(bytes(ei.artifacts[f"{model_name}_manifest.json"]))
+    return {"artifacts": ei.artifacts, "variables": ei.var_list, "structs": ei.struct_members,
+            "manifest": manifest["files"]}
+
+
+def convert_deployment(model_name: str, deployment: str, force: bool, bundle: bool, compression: Optional[str],
+                       connection: "Connection"):
+    """
+    Converts a single deployment directory or archive and sends the result through a connection.
+    It is the target of the worker processes of `convert_batch()`, so any error is reported instead of raised.
+
+    The model folder is created inside a deployment directory. For an archive, it is created inside a
+    directory next to it with the name of the archive without its extension.
+
+    Args:
+        model_name (str): The folder and prefix of files to create.
+        deployment (str): The path of the deployment directory or archive.
+        force (bool): Regenerate all the files even if they are up-to-date with the inputs.
+        bundle (bool): Also pack the model folder into a single `model.bundle` file next to it.
+        compression (str): The codec to compress the files of `drpai_model.h` with, or None.
+        connection (Connection): The connection to send the result dictionary with `success`, `error` and
+            `peak_memory` (in KB) to.
+    """
+    result = {"success": False, "error": None}
+    try:
+        if os.path.isdir(deployment):
+            ei = EdgeImpulse2GstDRPAI(model_name, deployment, force=force, bundle=bundle, compression=compression)
+        else:
+            working_directory = deployment
+            for extension in ARCHIVE_EXTENSIONS:
+                if working_directory.endswith(extension):
+                    working_directory = working_directory[:-len(extension)]
+                    break
+            ei = EdgeImpulse2GstDRPAI(model_name, working_directory, force=force, source=deployment, bundle=bundle,
+                                      compression=compression)
+        ei.run()
+        result["success"] = True
+    except Exception as e:
+        logging.exception(f"Failed to convert {deployment}")
+        result["error"] = f"{type(e).__name__}: {e}"
+    result["peak_memory"] = resource_usage()[1] or None
+    connection.send(result)
+    connection.close()
+
+
+def convert_batch(model_name: str, deployments: List[str], workers: int, force: bool = False,
+                  bundle: bool = False, compression: Optional[str] = None) -> List[dict]:
+    """
+    Converts many deployment directories or archives concurrently.
+
+    Each deployment is converted in its own process, so a corrupt model (or even a crashing worker)
+    doesn't abort the others, and the peak memory is measured per model. The processes are forked
+    when the platform allows, so the imported modules are not loaded again for each model.
+
+    Args:
+        model_name (str): The folder and prefix of files to create for each deployment.
+        deployments (list[str]): The paths of the deployment directories or archives.
+        workers (int): The maximum number of deployments to convert at the same time.
+        force (bool): Regenerate all the files even if they are up-to-date with the inputs.
+        bundle (bool): Also pack each model folder into a single `model.bundle` file next to it.
+        compression (str): The codec to compress the files of `drpai_model.h` with, or None.
+
+    Returns:
+        list[dict]: The result of each deployment in the same order, with `deployment`, `success`, `error`,
+            `wall_time` (in seconds) and `peak_memory` (in KB) keys.
+    """
+    import multiprocessing
+    import multiprocessing.connection
+    logging.info(f"Converting {len(deployments)} deployments with {workers} workers")
+    results = dict()
+    pending = list(deployments)
+    running = dict()    # The receiving connection of each running process -> (process, deployment, start time)
+    while len(pending) > 0 or len(running) > 0:
+        # Start new processes while there are free workers
+        while len(pending) > 0 and len(running) < workers:
+            deployment = pending.pop(0)
+            receiver, sender = multiprocessing.Pipe(duplex=False)
+            process = multiprocessing.Process(target=convert_deployment,
+                                              args=(model_name, deployment, force, bundle, compression, sender))
+            process.start()
+            sender.close()
+            running[receiver] = (process, deployment, time.perf_counter())
+
+        # Wait until at least one of them finishes
+        for receiver in multiprocessing.connection.wait(list(running.keys())):
+            process, deployment, start_time = running.pop(receiver)
+            try:
+                result = receiver.recv()
+            except EOFError:
+                # The process has died without sending any result
+                process.join()
+                result = {"success": False, "error": f"The worker exited with code {process.exitcode}.",
+                          "peak_memory": None}
+            receiver.close()
+            process.join()
+            result["deployment"] = deployment
+            result["wall_time"] = time.perf_counter() - start_time
+            results[deployment] = result
+    return [results[deployment] for deployment in deployments]
+
+
+def read_batch_file(file_path: str) -> List[str]:
+    """
+    Reads a batch manifest file which lists a deployment directory or archive path on each line.
+    Empty lines and lines starting with `#` are ignored, and relative paths are relative to the manifest file.
+
+    Args:
+        file_path (str): The path of the manifest file.
+
+    Returns:
+        list[str]: The deployment paths.
+    """
+    base_directory = os.path.dirname(file_path)
+    deployments = list()
+    with open(file_path, "rt") as f:
+        for line in f:
+            line = line.strip()
+            if len(line) > 0 and not line.startswith("#"):
+                deployments.append(os.path.join(base_directory, line))
+    return deployments
+
+
+def format_batch_summary(results: List[dict]) -> str:
+    """
+    Formats the results of `convert_batch()` as a table.
+
+    Args:
+        results (list[dict]): The results of `convert_batch()`.
+
+    Returns:
+        str: The table with a row per deployment and a total row.
+    """
+    width = max([len("Deployment")] + [len(r["deployment"]) for r in results])
+    lines = [f"{'Deployment':<{width}}  {'Wall time':>10}  {'Peak memory':>12}  Result",
+             f"{'-' * width}  {'-' * 10}  {'-' * 12}  {'-' * 6}"]
+    for r in results:
+        peak_memory = f"{r['peak_memory'] / 1024:.1f} MB" if r["peak_memory"] is not None else "-"
+        outcome = "OK" if r["success"] else f"FAILED ({r['error']})"
+        lines.append(f"{r['deployment']:<{width}}  {r['wall_time']:>8.2f} s  {peak_memory:>12}  {outcome}")
+    succeeded = sum(1 for r in results if r["success"])
+    lines.append(f"{succeeded} of {len(results)} deployments converted successfully.")
+    return "\n".join(lines)
+
+
+def watch_deployment(model_name: str, working_directory: str = '.', interval: float = 1.0, debounce: float = 2.0,
+                     jobs: int = 1, bundle: bool = False, compression: Optional[str] = None):
+    """
+    Converts a deployment directory, then keeps converting it again whenever its input files change,
+    until the process is interrupted. The input files are watched by `watch_inputs()`.
+
+    The build cache skips the stages whose inputs are unchanged, and the hashes of the unchanged input files
+    are kept between the runs, so they are not read again. As the process stays alive, the modules are only
+    imported once.
+
+    Args:
+        model_name (str): The folder and prefix of files to create.
+        working_directory (str): The deployment directory that contains 'tflite-model' and 'model-parameters'.
+        interval (float): The seconds between the polls of the input files.
+        debounce (float): The seconds the input files must stay unchanged before they are converted.
+        jobs (int): The number of processes to extract the model files in parallel.
+        bundle (bool): Also pack the model folder into a single `model.bundle` file next to it.
+        compression (str): The codec to compress the files of `drpai_model.h` with, or None.
+    """
+    known_hashes = dict()   # The (signature, SHA-256) of each input file, kept between the runs
+
+    def convert(signatures: Dict[str, Tuple[int, int]]):
+        start_time = time.perf_counter()
+        ei = EdgeImpulse2GstDRPAI(model_name, working_directory, jobs=jobs, bundle=bundle, compression=compression)
+        ei.input_hashes.update({name: digest for name, (signature, digest) in known_hashes.items()
+                                if signatures.get(name) == signature})
+        ei.run()
+        known_hashes.update({name: (signatures.get(name), digest) for name, digest in ei.input_hashes.items()})
+        stages = [m["stage"] for m in ei.report if not m["cached"]]
+        logging.info(f"Converted {ei.model_path} in {time.perf_counter() - start_time:.2f} s, "
+                     f"running {', '.join(stages)}")
+
+    from deployment_watch import watch_inputs
+    watch_inputs(working_directory, convert, (DRPAI_MODEL_FILE, MODEL_METADATA_FILE, MODEL_VARIABLES_FILE),
+                 interval, debounce)
 
 
 if __name__ == '__main__':
@@ -500,15 +1905,160 @@ if __name__ == '__main__':
     
     Command-line Arguments:
         model_name (str): The folder and prefix of files to create.
+        --jobs N (int): The number of processes to extract the model files in parallel.
+        --force: Regenerate all the files even if they are up-to-date with the inputs.
+        --source PATH (str): A .zip or .tar.gz deployment archive to read instead of the extracted directories.
+        --batch DEPLOYMENT [DEPLOYMENT ...] (str): Convert many deployment directories or archives concurrently.
+        --batch-file FILE (str): A file that lists a deployment directory or archive to convert on each line.
+        --report FILE (str): Write the time, memory and I/O measurements of each stage in a JSON file.
+        --profile FILE (str): Profile the stages with cProfile and write the statistics in a file for `pstats`.
+        --trace-memory: Trace the Python memory allocations to add the peak of each stage to the report.
+        --bundle: Also pack the model folder into a single `model_name.bundle` file next to it.
+        --compress CODEC (str): Compress the memory region files of drpai_model.h with `gzip` or `xz`.
+        --unpack BUNDLE (str): Recreate the model folder from a bundle instead of converting a deployment.
+        --verify: Check the files of the model folder against its manifest instead of converting a deployment.
+        --delta OLD_FOLDER (str): Write a `model_name.patch` file that updates OLD_FOLDER to the model folder.
+        --apply PATCH (str): Update the model folder with a delta patch instead of converting a deployment.
+        --watch: Keep running and convert the deployment again whenever its input files change.
+        --debounce SECONDS (float): The seconds the input files must stay unchanged before --watch converts them.
+        --benchmark: Benchmark yolov5.part2 of the model folder on the CPU with the TFLite runtime.
+        --threads N (int): The number of threads of each interpreter in --benchmark.
+        --warmup N (int): The number of frames each interpreter runs before the measurements.
+        --iterations N (int): The number of measured frames of each interpreter.
+        --interpreters N (int): The number of interpreters that run in parallel in --benchmark.
     
     Example:
         $ python3 ei2gst_drpai.py model
+        $ python3 ei2gst_drpai.py model --batch exports/*.zip exports/variant1 --workers 4
+        $ python3 ei2gst_drpai.py model --unpack model.bundle
+        $ python3 ei2gst_drpai.py model --verify
+        $ python3 ei2gst_drpai.py model --delta old/model && python3 ei2gst_drpai.py old/model --apply model.patch
+        $ python3 ei2gst_drpai.py model --watch
+        $ python3 ei2gst_drpai.py model --benchmark --threads 2 --interpreters 2
     """
 
     parser = argparse.ArgumentParser(prog='EdgeImpulse2GstDRPAI',
                                      description='EdgeImpulse DRPAI Deployment to GStreamer DRPAI plugin translator')
     parser.add_argument('model_name', help='The folder and prefix of files to create.')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count() or 1,
+                        help='The number of processes to extract the model files in parallel. (default: CPU count)')
+    parser.add_argument('-f', '--force', action='store_true',
+                        help='Regenerate all the files even if they are up-to-date with the inputs.')
+    parser.add_argument('-s', '--source',
+                        help='A .zip or .tar.gz deployment archive to read instead of the extracted directories.')
+    parser.add_argument('-b', '--batch', nargs='+', metavar='DEPLOYMENT', default=[],
+                        help='Convert many deployment directories or archives concurrently, using --workers '
+                             'processes.')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='The number of deployments that --batch converts at the same time, each with a single '
+                             'job. (default: 1)')
+    parser.add_argument('--batch-file', metavar='FILE',
+                        help='A file that lists a deployment directory or archive to convert on each line.')
+    parser.add_argument('-r', '--report', metavar='FILE',
+                        help='Write the time, memory and I/O measurements of each stage in a JSON file.')
+    parser.add_argument('--profile', metavar='FILE',
+                        help='Profile the stages with cProfile and write the statistics in a file for `pstats`.')
+    parser.add_argument('--trace-memory', action='store_true',
+                        help='Trace the Python memory allocations to add the peak of each stage to the report.')
+    parser.add_argument('--bundle', action='store_true',
+                        help='Also pack the model folder into a single MODEL_NAME.bundle file next to it.')
+    parser.add_argument('--compress', choices=COMPRESSION_CODECS,
+                        help='Compress the memory region files of drpai_model.h with gzip or xz while they are '
+                             'decoded.')
+    parser.add_argument('--unpack', metavar='BUNDLE',
+                        help='Recreate the model folder from a bundle instead of converting a deployment.')
+    parser.add_argument('--verify', action='store_true',
+                        help='Check the files of the model folder against its manifest instead of converting a '
+                             'deployment, hashing --jobs files in parallel.')
+    parser.add_argument('--delta', metavar='OLD_FOLDER',
+                        help='Write a MODEL_NAME.patch file that updates OLD_FOLDER to the model folder, '
+                             'instead of converting a deployment.')
+    parser.add_argument('--apply', metavar='PATCH',
+                        help='Update the model folder with a delta patch instead of converting a deployment.')
+    parser.add_argument('-w', '--watch', action='store_true',
+                        help='Keep running and convert the deployment again whenever its input files change.')
+    parser.add_argument('--debounce', type=float, default=2.0,
+                        help='The seconds the input files must stay unchanged before --watch converts them. '
+                             '(default: 2)')
+    parser.add_argument('--benchmark', action='store_true',
+                        help='Benchmark yolov5.part2 of the model folder on the CPU instead of converting a '
+                             'deployment. It needs the tflite-runtime package.')
+    parser.add_argument('--threads', type=int, default=1,
+                        help='The number of threads of each interpreter in --benchmark. (default: 1)')
+    parser.add_argument('--warmup', type=int, default=10,
+                        help='The number of frames each interpreter runs before the measurements. (default: 10)')
+    parser.add_argument('--iterations', type=int, default=100,
+                        help='The number of measured frames of each interpreter. (default: 100)')
+    parser.add_argument('--interpreters', type=int, default=1,
+                        help='The number of interpreters that run in parallel in --benchmark. (default: 1)')
     args = parser.parse_args()
-
-    ei = EdgeImpulse2GstDRPAI(args.model_name)
+    if args.jobs < 1:
+        parser.error("--jobs must be at least 1.")
+
+    if args.delta is not None:
+        patch_path = f"{os.path.normpath(args.model_name)}.patch"
+        from delta_patch import create_patch
+        stats = create_patch(args.delta, args.model_name, patch_path)
+        print(f"Wrote {patch_path}: {stats['patch_size'] / 1024:.1f} KB to update {stats['new_size'] / 1024:.1f} KB "
+              f"of files, {stats['reused'] / max(stats['new_size'], 1):.1%} of which are reused from {args.delta}.")
+        sys.exit(0)
+
+    if args.apply is not None:
+        from delta_patch import apply_patch
+        apply_patch(args.apply, args.model_name)
+        sys.exit(0)
+
+    if args.verify:
+        mismatch = verify_manifest(args.model_name, args.jobs)
+        print(mismatch if mismatch is not None else f"All the files of {args.model_name} match the manifest.")
+        sys.exit(0 if mismatch is None else 1)
+
+    if args.benchmark:
+        for option in ("threads", "iterations", "interpreters"):
+            if getattr(args, option) < 1:
+                parser.error(f"--{option} must be at least 1.")
+        if args.warmup < 0:
+            parser.error("--warmup must be at least 0.")
+        from part2_benchmark import benchmark_part2
+        results = benchmark_part2(args.model_name, os.path.basename(os.path.normpath(args.model_name)),
+                                  args.threads, args.warmup, args.iterations, args.interpreters)
+        latency = results["latency_ms"]
+        print(f"yolov5.part2 with {args.interpreters} interpreter(s) of {args.threads} thread(s): "
+              f"{results['fps']:.1f} frames/s, latency mean {latency['mean']:.2f} ms, p50 {latency['p50']:.2f} ms, "
+              f"p90 {latency['p90']:.2f} ms, p99 {latency['p99']:.2f} ms, max {latency['max']:.2f} ms")
+        if args.report is not None:
+            with open(args.report, "wt") as f:
+                json.dump(results, f, indent=2)
+        sys.exit(0)
+
+    if args.unpack is not None:
+        from model_bundle import ModelBundle
+        with ModelBundle(args.unpack) as model_bundle:
+            model_bundle.unpack(args.model_name)
+        sys.exit(0)
+
+    if len(args.batch) > 0 or args.batch_file is not None:
+        deployments = args.batch + (read_batch_file(args.batch_file) if args.batch_file is not None else [])
+        if args.workers < 1:
+            parser.error("--workers must be at least 1.")
+        batch_results = convert_batch(args.model_name, deployments, args.workers, args.force, args.bundle,
+                                      args.compress)
+        print(format_batch_summary(batch_results))
+        sys.exit(0 if all(r["success"] for r in batch_results) else 1)
+
+    if args.watch:
+        if args.source is not None:
+            parser.error("--watch needs an extracted deployment directory instead of --source.")
+        with contextlib.suppress(KeyboardInterrupt):
+            watch_deployment(args.model_name, debounce=args.debounce, jobs=args.jobs, bundle=args.bundle,
+                             compression=args.compress)
+        sys.exit(0)
+
+    ei = EdgeImpulse2GstDRPAI(args.model_name, jobs=args.jobs, force=args.force, source=args.source,
+                              profile=args.profile is not None, trace_memory=args.trace_memory, bundle=args.bundle,
+                              compression=args.compress)
     ei.run()
+    if args.report is not None:
+        ei.write_report(args.report)
+    if args.profile is not None:
+        ei.profiler.dump_stats(args.profile)
@@ -0,0 +1,221 @@
+"""
+The model bundle: a single file that holds all the files of a model folder, so copying it to the board and
+loading it takes a single I/O.
+
+It starts with a `BUNDLE_HEADER` and an index entry per file with its name, offset, size and SHA-256, and each
+file starts at a `BUNDLE_ALIGNMENT` boundary. So the bundle can be mapped with `mmap` and each file used in place
+by `ModelBundle`, without copying it.
+
+Example:
+    >>> size = pack_bundle('yolov5', sorted(os.listdir('yolov5')), 'yolov5.bundle')
+    >>> with ModelBundle('yolov5.bundle') as bundle:
+    ...     bundle.unpack('yolov5_copy')
+"""
+import os
+import mmap
+import struct
+import hashlib
+from typing import List
+
+# The layout of a model bundle: a header, an index entry per member and the members at aligned offsets
+BUNDLE_MAGIC = b"EI2GSTB\0"
+BUNDLE_VERSION = 1
+BUNDLE_ALIGNMENT = 4096                         # Each member starts on a page, so it can be mapped on its own
+BUNDLE_HEADER = struct.Struct("<8sHHI")         # magic, version, alignment, number of members
+BUNDLE_ENTRY = struct.Struct("<80sQQ32s")       # name, offset, size, SHA-256 of the member
+COPY_CHUNK_SIZE = 1024 * 1024                   # The number of bytes to read at once while copying a file
+
+
+def is_plain_file_name(name: str) -> bool:
+    """
+    Checks that a file name read from a bundle or a patch stays inside the directory it is joined to.
+
+    Args:
+        name (str): The file name.
+
+    Returns:
+        bool: True if the name is a single path component, without separators, and not `.` or `..`.
+
+    Example:
+        >>> [is_plain_file_name(name) for name in ('yolov5_weight.dat', '../escaped.txt', '/etc/passwd', '..')]
+        [True, False, False, False]
+    """
+    return name not in ("", ".", "..") and os.path.basename(name) == name and "\\" not in name
+
+
+def copy_file_data(source_fd: int, source_offset: int, destination_fd: int, destination_offset: int, size: int):
+    """
+    Copies a range of bytes between two files. On Linux, the data is copied inside the kernel by
+    `os.copy_file_range()` without passing through the user space. Otherwise, it is read and written in chunks.
+
+    Args:
+        source_fd (int): The file descriptor to read from.
+        source_offset (int): The position in the source file to start reading from.
+        destination_fd (int): The file descriptor to write to.
+        destination_offset (int): The position in the destination file to start writing to.
+        size (int): The number of bytes to copy.
+    """
+    copied = 0
+    if hasattr(os, "copy_file_range"):
+        try:
+            while copied < size:
+                count = os.copy_file_range(source_fd, destination_fd, size - copied,
+                                           source_offset + copied, destination_offset + copied)
+                if count == 0:
+                    break
+                copied += count
+        except OSError:
+            pass    # The file system doesn't support it, let's copy the rest in the user space.
+    while copied < size:
+        chunk = os.pread(source_fd, min(COPY_CHUNK_SIZE, size - copied), source_offset + copied)
+        assert len(chunk) > 0, "The source file is shorter than the range to copy."
+        copied += os.pwrite(destination_fd, chunk, destination_offset + copied)
+
+
+def pack_bundle(directory: str, names: List[str], bundle_path: str) -> int:
+    """
+    Packs files into a single model bundle, so a device can load all the files of a model with one open and
+    one `mmap()` instead of many small I/Os.
+
+    The bundle starts with a `BUNDLE_HEADER` and a `BUNDLE_ENTRY` per file with its name, offset, size and SHA-256.
+    The contents of the files follow, each aligned to `BUNDLE_ALIGNMENT` bytes. The checksums are calculated
+    while the files are copied, and the bundle is written to a temporary file that replaces `bundle_path` at
+    the end, so a reader never sees a half-written bundle.
+
+    Args:
+        directory (str): The directory of the files.
+        names (list[str]): The names of the files in the directory to pack.
+        bundle_path (str): The path of the bundle file to write.
+
+    Returns:
+        int: The size of the bundle in bytes.
+
+    Raises:
+        AssertionError: If a file name is longer than the index entry allows, or is not a plain file name.
+    """
+    entries = list()
+    offset = BUNDLE_HEADER.size + BUNDLE_ENTRY.size * len(names)
+    with open(f"{bundle_path}.tmp", "wb") as bundle:
+        for name in names:
+            encoded_name = name.encode()
+            assert len(encoded_name) <= 80, f"The file name {name} is too long for a bundle."
+            assert is_plain_file_name(name), f"The file name {name} of a bundle can't have a directory."
+            offset += -offset % BUNDLE_ALIGNMENT
+            bundle.seek(offset)     # The padding is left as a hole of zeros
+            digest = hashlib.sha256()
+            size = 0
+            with open(f"{directory}/{name}", "rb") as f:
+                for chunk in iter(lambda: f.read(COPY_CHUNK_SIZE), b""):
+                    digest.update(chunk)
+                    bundle.write(chunk)
+                    size += len(chunk)
+            entries.append(BUNDLE_ENTRY.pack(encoded_name, offset, size, digest.digest()))
+            offset += size
+        bundle.seek(0)
+        bundle.write(BUNDLE_HEADER.pack(BUNDLE_MAGIC, BUNDLE_VERSION, BUNDLE_ALIGNMENT, len(names)))
+        bundle.write(b"".join(entries))
+        bundle.truncate(offset)
+    os.replace(f"{bundle_path}.tmp", bundle_path)
+    return offset
+
+
+class ModelBundle:
+    """
+    Reads a model bundle written by `pack_bundle()` through a read-only memory map.
+
+    The members can be accessed without copying them with `get()`, extracted to a file with `extract()`,
+    or all unpacked to recreate the model folder with `unpack()`.
+
+    Parameters:
+        bundle_path (str): The path of the bundle file.
+
+    Example:
+        >>> with ModelBundle('yolov5.bundle') as bundle:
+        ...     weights = bundle.get('yolov5_weight.dat')   # A memoryview of the mapped file
+        ...     bundle.unpack('yolov5')
+    """
+
+    def __init__(self, bundle_path: str):
+        self.bundle_path = bundle_path
+        self.file = open(bundle_path, "rb")
+        self.mm = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.alignment, count = BUNDLE_HEADER.unpack_from(self.mm, 0)
+        assert magic == BUNDLE_MAGIC, f"{bundle_path} is not a model bundle."
+        assert version == BUNDLE_VERSION, f"{bundle_path} has an unsupported bundle version {version}."
+        self.members = dict()   # name -> (offset, size, SHA-256 digest)
+        for i in range(count):
+            name, offset, size, digest = BUNDLE_ENTRY.unpack_from(self.mm, BUNDLE_HEADER.size + i * BUNDLE_ENTRY.size)
+            name = name.rstrip(b"\0").decode()
+            assert offset + size <= len(self.mm), f"{bundle_path} is truncated."
+            # The names are joined to the directory of `unpack()`, so they must not lead out of it
+            assert is_plain_file_name(name), f"{bundle_path} has an invalid member name {name!r}."
+            self.members[name] = (offset, size, digest)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def get(self, name: str) -> memoryview:
+        """
+        Returns the contents of a member without copying them.
+
+        Args:
+            name (str): The name of the member, e.g. `yolov5_weight.dat`.
+
+        Returns:
+            memoryview: The view of the member in the memory map. It must be released before `close()`.
+        """
+        offset, size, _ = self.members[name]
+        return memoryview(self.mm)[offset:offset + size]
+
+    def verify(self, name: str) -> bool:
+        """
+        Checks the contents of a member against its checksum in the index.
+
+        Args:
+            name (str): The name of the member.
+
+        Returns:
+            bool: True if the SHA-256 of the member matches.
+        """
+        with self.get(name) as data:
+            return hashlib.sha256(data).digest() == self.members[name][2]
+
+    def extract(self, name: str, file_path: str):
+        """
+        Writes a member to a file. The data is copied by the kernel when possible, see `copy_file_data()`.
+
+        Args:
+            name (str): The name of the member.
+            file_path (str): The path of the file to write.
+        """
+        offset, size, _ = self.members[name]
+        with open(file_path, "wb") as f:
+            copy_file_data(self.file.fileno(), offset, f.fileno(), 0, size)
+
+    def unpack(self, directory: str):
+        """
+        Recreates the model folder from all the members. All the checksums are verified before writing anything.
+
+        Args:
+            directory (str): The directory to write the members in. It is created if it doesn't exist.
+
+        Raises:
+            AssertionError: If a member doesn't match its checksum.
+        """
+        for name in self.members:
+            assert self.verify(name), f"{name} in {self.bundle_path} seems to be corrupt."
+        os.makedirs(directory, exist_ok=True)
+        from loguru import logger
+        for name in self.members:
+            logger.info(f"  Writing file: {directory}/{name}")
+            self.extract(name, f"{directory}/{name}")
+
+    def close(self):
+        """
+        Unmaps and closes the bundle file.
+        """
+        self.mm.close()
+        self.file.close()
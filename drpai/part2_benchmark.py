@@ -0,0 +1,127 @@
+"""
+The CPU benchmark of the `yolov5.part2` tail model of a model folder, which the plugin runs with the TFLite
+runtime after the DRP-AI part of the network. It needs the `tflite-runtime` package, which is not a requirement
+of the converter, so it is only imported when a benchmark runs.
+
+Example:
+    $ python3 ei2gst_drpai.py yolov5 --benchmark --threads 2 --interpreters 2
+"""
+import re
+import time
+import contextlib
+from typing import List
+
+
+def benchmark_part2(model_path: str, model_name: str, threads: int = 1, warmup: int = 10, iterations: int = 100,
+                    interpreters: int = 1) -> dict:
+    """
+    Benchmarks the `yolov5.part2` tail model of a model folder on the CPU with the TFLite runtime.
+
+    The inputs are random tensors shaped for the grid sizes of `model_data_out_list.txt`, which are written in
+    the input buffers of each interpreter once, so every frame only runs the model. With more than one
+    interpreter, they run concurrently in threads after their warm-up, like the streams of a multi-camera board.
+
+    Args:
+        model_path (str): The path of the model folder.
+        model_name (str): The prefix of the files in the model folder.
+        threads (int): The `num_threads` of each interpreter.
+        warmup (int): The number of frames each interpreter runs before the measurements.
+        iterations (int): The number of measured frames of each interpreter.
+        interpreters (int): The number of interpreters that run in parallel.
+
+    Returns:
+        dict: The settings, the `frames`, `wall_time` and `fps` of all the interpreters together, and the
+            mean, percentiles and maximum of the frame latencies in milliseconds.
+
+    Raises:
+        AssertionError: If `threads`, `iterations` or `interpreters` is less than 1, or `warmup` is negative.
+        ImportError: If the TFLite runtime is not installed, as it is not a requirement of the converter.
+
+    Example:
+        >>> benchmark_part2("yolov5", "yolov5", threads=2)["latency_ms"]["p50"]
+        4.1
+    """
+    assert threads >= 1, f"The number of threads must be at least 1, not {threads}."
+    assert iterations >= 1, f"The number of iterations must be at least 1, not {iterations}."
+    assert interpreters >= 1, f"The number of interpreters must be at least 1, not {interpreters}."
+    assert warmup >= 0, f"The number of warm-up frames must be at least 0, not {warmup}."
+    try:
+        import tflite_runtime.interpreter as tflite
+    except ImportError:
+        raise ImportError("Benchmarking yolov5.part2 needs the TFLite runtime, which is not a requirement of the "
+                          "converter. Install it with `pip3 install tflite-runtime`.") from None
+    import threading
+    import numpy as np
+    from loguru import logger
+    from concurrent.futures import ThreadPoolExecutor
+
+    with open(f"{model_path}/{model_name}_data_out_list.txt", "rt") as f:
+        grids = [int(g) for g in re.findall(r"^\s*Width\s*:\s*(\d+)", f.read(), re.MULTILINE)]
+    assert len(grids) > 0, f"No output grids are found in {model_path}/{model_name}_data_out_list.txt."
+    with open(f"{model_path}/yolov5.part2", "rb") as f:
+        model = f.read()
+    rng = np.random.default_rng(0)
+
+    def random_input(detail: dict) -> "np.ndarray":
+        if np.issubdtype(detail["dtype"], np.integer):
+            limits = np.iinfo(detail["dtype"])
+            return rng.integers(limits.min, limits.max, detail["shape"], dtype=detail["dtype"], endpoint=True)
+        return rng.standard_normal(detail["shape"]).astype(detail["dtype"])
+
+    def create_interpreter():
+        interpreter = tflite.Interpreter(model_content=model, num_threads=threads)
+        # The i-th input takes the i-th grid, and its dynamic dimensions are set to a batch of one grid
+        for i, detail in enumerate(interpreter.get_input_details()):
+            g = grids[min(i, len(grids) - 1)]
+            signature = list(detail["shape_signature"])
+            if -1 in signature:
+                shape = [d if d != -1 else (1 if j == 0 else g) for j, d in enumerate(signature)]
+                interpreter.resize_tensor_input(detail["index"], shape)
+            elif g not in detail["shape"][1:]:
+                logger.warning(f"The input {detail['name']} of yolov5.part2 has the shape {list(detail['shape'])} "
+                               f"that doesn't match the grid size {g}.")
+        interpreter.allocate_tensors()
+        for detail in interpreter.get_input_details():
+            interpreter.set_tensor(detail["index"], random_input(detail))
+        return interpreter
+
+    def run(interpreter, start: threading.Barrier) -> List[float]:
+        try:
+            for _ in range(warmup):
+                interpreter.invoke()
+        except BaseException:
+            start.abort()       # Releases the others, so the error is raised by `future.result()`
+            raise
+        start.wait()
+        latencies = list()
+        for _ in range(iterations):
+            begin = time.perf_counter()
+            interpreter.invoke()
+            latencies.append(time.perf_counter() - begin)
+        return latencies
+
+    pool = [create_interpreter() for _ in range(interpreters)]
+    start = threading.Barrier(interpreters + 1)     # Starts the measurements when all the warm-ups are done
+    with ThreadPoolExecutor(max_workers=interpreters) as executor:
+        futures = [executor.submit(run, interpreter, start) for interpreter in pool]
+        with contextlib.suppress(threading.BrokenBarrierError):
+            start.wait()
+        start_time = time.perf_counter()
+        latencies = np.array([t for future in futures for t in future.result()]) * 1000
+        wall_time = time.perf_counter() - start_time
+
+    return {
+        "threads": threads,
+        "interpreters": interpreters,
+        "grids": grids,
+        "frames": len(latencies),
+        "wall_time": wall_time,
+        "fps": len(latencies) / wall_time,
+        "latency_ms": {
+            "mean": float(latencies.mean()),
+            "p50": float(np.percentile(latencies, 50)),
+            "p90": float(np.percentile(latencies, 90)),
+            "p99": float(np.percentile(latencies, 99)),
+            "max": float(latencies.max()),
+        },
+    }
@@ -0,0 +1,296 @@
+"""
+Host-side reference of the YOLOv5 post-processing that the GStreamer DRPAI plugin runs on the board.
+
+It loads the grid sizes from `model_data_out_list.txt`, the anchors from `model_anchors.txt`, the IoU threshold
+from `model_post_process_params.txt` and the labels from `model_labels.txt` of a generated model folder. Then it
+decodes the raw grid outputs of many frames at once with NumPy and runs a class-aware NMS on all of them together.
+So the generated files can be checked, and the cost of the post-processing estimated, before they are deployed.
+
+The anchors are paired with the output grids in the order of the files, as the plugin does. A wrong order of
+`model_anchors.txt` shows as boxes of the wrong sizes.
+
+Example:
+    $ python3 yolov5_reference.py yolov5 outputs.bin --confidence 0.25
+"""
+import os
+import argparse
+from typing import Tuple, List, Dict, Optional
+
+import numpy as np
+
+NUM_ANCHORS = 3                 # The anchors of each grid cell
+NUM_BOX_VALUES = 5              # The x, y, width, height and objectness before the class scores
+NMS_BLOCK_SIZE = 1 << 24        # The maximum number of IoU values that `batched_nms()` computes at once
+
+
+def read_node_list(file_path: str) -> List[Dict[str, str]]:
+    """
+    Reads a `model_data_in_list.txt` or `model_data_out_list.txt` file.
+
+    Args:
+        file_path (str): The path of the file.
+
+    Returns:
+        list[dict[str, str]]: The `name` and the other fields of each node, in the order of the file.
+
+    Example:
+        >>> read_node_list("yolov5/yolov5_data_out_list.txt")[0]
+        {'name': 'NUM_GRID_1', 'Address': '0', 'Channel': '0', 'Width': '20', 'Height': '20'}
+    """
+    nodes = list()
+    with open(file_path, "rt") as f:
+        for line in f:
+            key, _, value = line.partition(":")
+            key = key.strip()
+            if key.endswith("_node_name"):
+                nodes.append({"name": value.strip()})
+            elif key and len(nodes) > 0:
+                nodes[-1][key] = value.strip()
+    return nodes
+
+
+def read_post_process_params(file_path: str) -> Dict[str, str]:
+    """
+    Reads a `model_post_process_params.txt` file with a value under each `[section]`.
+
+    Args:
+        file_path (str): The path of the file.
+
+    Returns:
+        dict[str, str]: The value of each section.
+
+    Example:
+        >>> read_post_process_params("yolov5/yolov5_post_process_params.txt")
+        {'dynamic_library': 'libgstdrpai-yolo.so', 'yolo_version': '5', 'iou_threshold': '0.45'}
+    """
+    params = dict()
+    section = None
+    with open(file_path, "rt") as f:
+        for line in f:
+            line = line.strip()
+            if line.startswith("[") and line.endswith("]"):
+                section = line[1:-1]
+            elif line and section is not None:
+                params[section] = line
+    return params
+
+
+def sigmoid(x: np.ndarray) -> np.ndarray:
+    return 1 / (1 + np.exp(-x))
+
+
+def batched_nms(boxes: np.ndarray, scores: np.ndarray, classes: np.ndarray, frames: np.ndarray,
+                iou_threshold: float, max_candidates: int = 4096) -> np.ndarray:
+    """
+    Runs a class-aware non-maximum suppression on the boxes of many frames together.
+
+    The boxes of each frame are sorted by their score and padded to the same count, so the IoU of every pair
+    in all the frames is computed with a few array operations. The greedy suppression is then solved as in
+    Cluster-NMS: a box is kept when no kept box with a higher score of the same class overlaps it more than
+    `iou_threshold`, which is repeated until the kept boxes don't change. The result is the same as suppressing
+    one box at a time, but each step covers all the frames at once.
+
+    Args:
+        boxes (np.ndarray): The `(n, 4)` boxes as `x1, y1, x2, y2`.
+        scores (np.ndarray): The `(n,)` scores of the boxes.
+        classes (np.ndarray): The `(n,)` class indices of the boxes.
+        frames (np.ndarray): The `(n,)` frame indices of the boxes.
+        iou_threshold (float): The IoU above which the box with the lower score is suppressed.
+        max_candidates (int): Only this many boxes with the highest scores of each frame are considered.
+
+    Returns:
+        np.ndarray: The indices of the kept boxes, sorted by frame and then by descending score.
+    """
+    if len(scores) == 0:
+        return np.empty(0, dtype=np.int64)
+
+    # Sort the boxes by frame and descending score, and find the rank of each box in its frame
+    order = np.lexsort((-scores, frames))
+    sorted_frames = frames[order]
+    num_frames = int(sorted_frames[-1]) + 1
+    starts = np.searchsorted(sorted_frames, np.arange(num_frames))
+    ranks = np.arange(len(order)) - starts[sorted_frames]
+    selected = ranks < max_candidates
+    order, sorted_frames, ranks = order[selected], sorted_frames[selected], ranks[selected]
+
+    # Pad the boxes of each frame to the same count
+    k = int(ranks.max()) + 1
+    padded_boxes = np.zeros((num_frames, k, 4), dtype=np.float32)
+    padded_classes = np.full((num_frames, k), -1, dtype=np.int64)
+    padded_boxes[sorted_frames, ranks] = boxes[order]
+    padded_classes[sorted_frames, ranks] = classes[order]
+    higher = np.triu(np.ones((k, k), dtype=bool), 1)      # Only a box with a higher score can suppress another
+
+    kept = np.zeros((num_frames, k), dtype=bool)
+    block = max(1, NMS_BLOCK_SIZE // (k * k))
+    for first in range(0, num_frames, block):
+        b = padded_boxes[first:first+block]
+        c = padded_classes[first:first+block]
+        areas = (b[..., 2] - b[..., 0]) * (b[..., 3] - b[..., 1])
+        inter_w = np.minimum(b[:, :, None, 2], b[:, None, :, 2]) - np.maximum(b[:, :, None, 0], b[:, None, :, 0])
+        inter_h = np.minimum(b[:, :, None, 3], b[:, None, :, 3]) - np.maximum(b[:, :, None, 1], b[:, None, :, 1])
+        intersection = np.clip(inter_w, 0, None) * np.clip(inter_h, 0, None)
+        iou = intersection / np.maximum(areas[:, :, None] + areas[:, None, :] - intersection, 1e-9)
+        overlaps = ((iou > iou_threshold) & (c[:, :, None] == c[:, None, :]) & higher).astype(np.float32)
+
+        # Keep the boxes that no kept box overlaps, until it converges to the greedy result
+        keep = c >= 0
+        valid = keep
+        for _ in range(k):
+            suppressed = np.matmul(keep[:, None, :].astype(np.float32), overlaps)[:, 0] > 0
+            new_keep = valid & ~suppressed
+            if np.array_equal(new_keep, keep):
+                break
+            keep = new_keep
+        kept[first:first+block] = keep
+
+    return order[kept[sorted_frames, ranks]]
+
+
+class YoloV5PostProcessor:
+    """
+    Decodes the raw YOLOv5 grid outputs of many frames into detections, with the parameters of a model folder.
+
+    The raw output of each grid is `NUM_ANCHORS * (5 + classes)` channels of `height * width` float32 values,
+    and the grids follow each other in the order of `model_data_out_list.txt`, like the output of the DRP-AI.
+
+    Example:
+        >>> post_processor = YoloV5PostProcessor("yolov5", confidence_threshold=0.25)
+        >>> detections = post_processor(post_processor.split_outputs(np.fromfile("outputs.bin", np.float32)))
+        >>> detections[0]   # x1, y1, x2, y2, score and class of each box of the first frame
+    """
+
+    def __init__(self, model_path: str, model_name: Optional[str] = None, confidence_threshold: float = 0.5,
+                 iou_threshold: Optional[float] = None, max_detections: int = 100, max_candidates: int = 4096):
+        """
+        Loads the parameters of the post-processing from a model folder.
+
+        Args:
+            model_path (str): The path of the model folder.
+            model_name (str): The prefix of the files in the model folder. (default: the name of the folder)
+            confidence_threshold (float): The minimum objectness multiplied by the class score of a box.
+            iou_threshold (float): Overrides the IoU threshold of `model_post_process_params.txt`.
+            max_detections (int): The maximum number of detections of each frame.
+            max_candidates (int): The maximum number of boxes of each frame that go through the NMS.
+        """
+        if model_name is None:
+            model_name = os.path.basename(os.path.normpath(model_path))
+        prefix = os.path.join(model_path, model_name)
+
+        params = read_post_process_params(f"{prefix}_post_process_params.txt")
+        assert params.get("yolo_version") == "5", f"The model is not a YOLOv5 model: {params.get('yolo_version')}"
+        self.iou_threshold = float(params["iou_threshold"]) if iou_threshold is None else iou_threshold
+        self.confidence_threshold = confidence_threshold
+        self.max_detections = max_detections
+        self.max_candidates = max_candidates
+
+        input_node = read_node_list(f"{prefix}_data_in_list.txt")[0]
+        self.input_width, self.input_height = int(input_node["Width"]), int(input_node["Height"])
+        self.grids = [(int(node["Width"]), int(node["Height"]))
+                      for node in read_node_list(f"{prefix}_data_out_list.txt")]
+
+        with open(f"{prefix}_labels.txt", "rt") as f:
+            self.labels = [line.rstrip("\n") for line in f if line.strip()]
+        self.num_classes = len(self.labels)
+
+        anchors = np.loadtxt(f"{prefix}_anchors.txt", dtype=np.float32, ndmin=1)
+        assert anchors.size == len(self.grids) * NUM_ANCHORS * 2, \
+            f"Expected {NUM_ANCHORS} anchors for each of the {len(self.grids)} grids, found {anchors.size / 2:g}."
+        self.anchors = anchors.reshape(len(self.grids), NUM_ANCHORS, 2)
+
+    @property
+    def output_sizes(self) -> List[int]:
+        """
+        The number of float32 values of each grid output.
+        """
+        channels = NUM_ANCHORS * (NUM_BOX_VALUES + self.num_classes)
+        return [channels * width * height for width, height in self.grids]
+
+    def split_outputs(self, raw: np.ndarray) -> List[np.ndarray]:
+        """
+        Splits the raw outputs of the frames into a view of each grid.
+
+        Args:
+            raw (np.ndarray): The float32 outputs of one frame, or the `(frames, values)` outputs of many.
+
+        Returns:
+            list[np.ndarray]: The `(frames, channels, height, width)` output of each grid.
+        """
+        raw = np.asarray(raw, dtype=np.float32)
+        raw = raw.reshape(-1, raw.shape[-1]) if raw.ndim > 1 else raw.reshape(-1, sum(self.output_sizes))
+        assert raw.shape[1] == sum(self.output_sizes), \
+            f"Expected {sum(self.output_sizes)} values in the outputs of a frame, found {raw.shape[1]}."
+        offsets = np.cumsum([0] + self.output_sizes)
+        return [raw[:, start:end].reshape(len(raw), -1, height, width)
+                for start, end, (width, height) in zip(offsets[:-1], offsets[1:], self.grids)]
+
+    def decode(self, outputs: List[np.ndarray]) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Decodes the grid outputs into the boxes with a score above the confidence threshold.
+
+        As the score is at most the objectness, the cells are filtered on the objectness logits first, so
+        the sigmoid and the box arithmetic only run on the candidates.
+
+        Args:
+            outputs (list[np.ndarray]): The `(frames, channels, height, width)` output of each grid.
+
+        Returns:
+            (np.ndarray, np.ndarray, np.ndarray, np.ndarray): The `(n, 4)` boxes as `x1, y1, x2, y2` in the
+                pixels of the model input, and the `(n,)` scores, class indices and frame indices of the boxes.
+        """
+        assert len(outputs) == len(self.grids), f"Expected {len(self.grids)} grid outputs, found {len(outputs)}."
+        threshold = np.log(self.confidence_threshold / (1 - self.confidence_threshold))
+        boxes, scores, classes, frames = list(), list(), list(), list()
+        for output, (width, height), anchors in zip(outputs, self.grids, self.anchors):
+            output = output.reshape(len(output), NUM_ANCHORS, NUM_BOX_VALUES + self.num_classes, height * width)
+            frame, anchor, cell = np.nonzero(output[:, :, 4] > threshold)
+            candidates = sigmoid(output[frame, anchor, :, cell])
+
+            class_scores = candidates[:, 4:5] * candidates[:, NUM_BOX_VALUES:]
+            best = class_scores.argmax(axis=1)
+            score = class_scores[np.arange(len(best)), best]
+            selected = score > self.confidence_threshold
+            candidates, anchor, cell = candidates[selected], anchor[selected], cell[selected]
+
+            stride = np.array([self.input_width / width, self.input_height / height], dtype=np.float32)
+            center = (candidates[:, 0:2] * 2 - 0.5 + np.stack([cell % width, cell // width], axis=1)) * stride
+            size = (candidates[:, 2:4] * 2) ** 2 * anchors[anchor]
+            boxes.append(np.concatenate([center - size / 2, center + size / 2], axis=1))
+            scores.append(score[selected])
+            classes.append(best[selected])
+            frames.append(frame[selected])
+        return np.concatenate(boxes), np.concatenate(scores), np.concatenate(classes), np.concatenate(frames)
+
+    def __call__(self, outputs: List[np.ndarray]) -> List[np.ndarray]:
+        """
+        Decodes the grid outputs and runs the NMS on the boxes of all the frames.
+
+        Args:
+            outputs (list[np.ndarray]): The `(frames, channels, height, width)` output of each grid.
+
+        Returns:
+            list[np.ndarray]: The `(n, 6)` detections of each frame as `x1, y1, x2, y2, score, class`,
+                sorted by descending score.
+        """
+        num_frames = len(outputs[0])
+        boxes, scores, classes, frames = self.decode(outputs)
+        kept = batched_nms(boxes, scores, classes, frames, self.iou_threshold, self.max_candidates)
+        detections = np.concatenate([boxes[kept], scores[kept, None], classes[kept, None]], axis=1)
+        bounds = np.searchsorted(frames[kept], np.arange(num_frames + 1))
+        return [detections[start:min(end, start + self.max_detections)]
+                for start, end in zip(bounds[:-1], bounds[1:])]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Reference YOLOv5 post-processing of a generated model folder')
+    parser.add_argument('model_path', help='The path of the model folder.')
+    parser.add_argument('outputs', help='A file with the float32 raw outputs of one or more frames.')
+    parser.add_argument('--confidence', type=float, default=0.5, help='The confidence threshold. (default: 0.5)')
+    args = parser.parse_args()
+
+    post_processor = YoloV5PostProcessor(args.model_path, confidence_threshold=args.confidence)
+    results = post_processor(post_processor.split_outputs(np.fromfile(args.outputs, dtype=np.float32)))
+    for i, detections in enumerate(results):
+        for x1, y1, x2, y2, score, c in detections:
+            print(f"{i:5d}  {post_processor.labels[int(c)]:<16}  {score:.3f}  "
+                  f"({x1:.1f}, {y1:.1f}) - ({x2:.1f}, {y2:.1f})")